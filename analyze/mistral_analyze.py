@@ -1,26 +1,81 @@
-import requests
 import json
+import os
+import re
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from utils.json_docx_work import *
+from utils.cache_work import SqliteCache
+from utils.metrics_work import propagate, record_llm_call
+from analyze.ollama_client import OllamaError, OllamaUnavailableError, get_ollama_client
+from analyze.verdict_schema import CRITERIA, batch_schema, parse_file_verdict
 
-def make_prompt(code_text: str) -> str:
+logger = logging.getLogger(__name__)
+
+# Количество одновременных запросов к Ollama (должно соответствовать OLLAMA_NUM_PARALLEL сервера)
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+MODEL_NAME = os.getenv("OLLAMA_MODEL", "mistral")
+# Потоковый режим: генерация останавливается сразу после завершения JSON-ответа
+OLLAMA_STREAM = os.getenv("OLLAMA_STREAM", "1") != "0"
+# Версия шаблона make_prompt: при изменении промпта нужно увеличить, чтобы не использовать старые ответы
+PROMPT_VERSION = "3"
+# Сколько раз переспрашивать модель о файле, ответ по которому не прошел проверку схемы
+MAX_REASKS = 2
+# Бюджет токенов кода в одном запросе (без учета инструкции промпта)
+CODE_TOKEN_BUDGET = int(os.getenv("LLM_CODE_TOKEN_BUDGET", "3000"))
+# Начало верхнеуровневого объявления (функция, класс и т.п.), по которым делятся большие файлы
+BLOCK_START = re.compile(
+    r'^(?:@|def |async def |class |function |export |public |private |protected |internal |'
+    r'static |abstract |final |func |fn |pub |impl |interface |struct |enum |type |module |namespace )'
+)
+
+# Кэш ответов модели по содержимому кода
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_verdicts.sqlite")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 24 * 60 * 60
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> SqliteCache:
+    """
+    Возвращает общий для процесса кэш ответов модели, создавая его при первом обращении.
+
+    Returns:
+        SqliteCache: Кэш ответов модели.
+    """
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = SqliteCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, ttl=LLM_CACHE_TTL)
+        return _llm_cache
+
+def make_prompt(files: Dict[str, str]) -> str:
     """"
     Формирование промпта для анализа кода на наличие код смеллов и антипаттернов.
+    В одном промпте может быть несколько файлов (или частей файлов), ответ модели - JSON
+    с результатом для каждого файла по его имени.
         
     Args:
-    code_text (str): Исходный код программы, который необходимо проанализировать
+    files (Dict[str, str]): Имя файла -> исходный код, который необходимо проанализировать
         
     Returns:
         str: Сформированный промпт
     """
+    code_text = "\n\n".join(f"### FILE: {name}\n{code}" for name, code in files.items())
 
     return """"
         You are a senior code reviewer and software quality expert. Your task is to analyze the given code strictly and precisely, based on the criteria below.
+        The input contains one or more files. Each file starts with a line "### FILE: <name>". Analyze every file separately.
 
         You must respond **only in valid JSON format**, using **double quotes only** for all fields. Each criterion must contain:
 
         - `"score"`: Integer from 0 (very bad) to 10 (excellent)
         - `"comment"`: Short summary of issues or good points
-        - `"examples"`: **Real problematic lines of code** (not descriptions!), extracted exactly as-is from the input. If no issues – leave as empty string.
+        - `"examples"`: **Real problematic lines of code** (not descriptions!), extracted exactly as-is from the input. If no issues – leave as empty list.
         - `"suggestions"`: Clear, practical suggestion(s) on how to fix or improve the examples provided
         - `"solution"`: A corrected version of the problematic code from `"examples"`, applying the suggestions above
         - `"legacy_context"`: true if the issue is caused by legacy technology or outdated standards
@@ -30,16 +85,17 @@ def make_prompt(code_text: str) -> str:
         - `"examples"` must contain **real code lines from the input** that illustrate the issue
         - `"solution"` must contain an **improved version of the actual example lines**
         - `"suggestions"` must be relevant to the specific problem in `"examples"`
-        - If there are no issues, use empty strings for `"examples"`, `"suggestions"` and `"solution"` and give a `"score"` of 10
+        - If there are no issues, use an empty list for `"examples"`, empty strings for `"suggestions"` and `"solution"` and give a `"score"` of 10
 
         Criteria:
         1. **Code Smells** – detect signs of poor quality like: duplicated logic, long functions, deeply nested code, unclear naming, dead code.
         2. **Anti-Patterns** – detect bad design or architecture practices like: God Object, Spaghetti Code, Magic Numbers, overuse of global state, etc.
         3. **Legacy Compatibility** – determine whether the code is old, and if the implementation was acceptable for its time and technical environment.
 
-        Respond in the following JSON format:
+        Respond with a JSON object whose keys are exactly the file names from the input, in the following format:
 
         {
+        "src/Manager.java": {
         "CodeSmells": {
             "score": 6,
             "comment": "Long method and repeated logic",
@@ -68,24 +124,27 @@ def make_prompt(code_text: str) -> str:
         "LegacyCompatibility": {
             "score": 10,
             "comment": "The code reflects acceptable practices for the platform and era.",
-            "examples": "",
+            "examples": [],
             "suggestions": "",
             "solution": "",
             "legacy_context": true,
             "forced_solution": false
         }
         }
+        }
         
         The code to analyze is:
         """ + code_text
 
-def mistral_analyze(prompt: str, history: str = "") -> dict:
+def mistral_analyze(prompt: str, history: str = "", schema: Optional[dict] = None) -> dict:
     """
     Анализ кода с помощью модели Mistral на наличие антипаттернов и код смеллов
 
     Args:
         prompt (str): Код для анализа
         history (str): История диалога с моделью (по умолчанию пустая строка)
+        schema (Optional[dict]): JSON-схема ответа; Ollama ограничивает генерацию этой схемой,
+            поэтому ответ разбирается без исправления регулярными выражениями
 
     Returns:
         dict: Результат анализа кода в виде JSON-а
@@ -101,11 +160,302 @@ def mistral_analyze(prompt: str, history: str = "") -> dict:
     talk_history.append({f"User: {prompt}"})
     full_prompt = "\n".join([str(item) for item in talk_history]) + "\nAssistant:"
 
-    print("Mistral is working!")
-    response = requests.post("http://localhost:11434/api/generate", json={
-        "model": "mistral",
-        "prompt": full_prompt,
-        "stream": False
-    })
+    logger.debug(f"Запрос к модели {MODEL_NAME}: ~{estimate_tokens(full_prompt)} токенов")
+    client = get_ollama_client()
+    options = {"format": schema} if schema else {}
+    started = time.perf_counter()
+    if OLLAMA_STREAM:
+        response = client.generate_stream(full_prompt, MODEL_NAME, **options)
+    else:
+        response = client.generate(full_prompt, MODEL_NAME, **options)
+    # если генерация остановлена до конца потока, сервер не сообщает размер промпта - используется оценка
+    record_llm_call(
+        time.perf_counter() - started,
+        response.get("prompt_eval_count") or estimate_tokens(full_prompt),
+        response.get("eval_count", response.get("tokens", 0))
+    )
+
+    if schema:
+        return json.loads(response['response'])
+    return json.loads(response['response'], cls=LazyDecoder)
+
+def summarize_history(text: str) -> str:
+    """
+    Сжатие истории анализа в краткое резюме с помощью модели Mistral
+
+    Args:
+        text (str): Записи истории анализа
+
+    Returns:
+        str: Резюме
+    """
+    prompt = (
+        "Summarize the following code review results of one developer in at most 150 words. "
+        "Keep score trends, recurring problems, security and style findings. "
+        "Respond with plain text only.\n\n" + text
+    )
+    started = time.perf_counter()
+    response = get_ollama_client().generate(prompt, MODEL_NAME)
+    record_llm_call(
+        time.perf_counter() - started,
+        response.get("prompt_eval_count") or estimate_tokens(prompt),
+        response.get("eval_count", response.get("tokens", 0))
+    )
+    return response['response'].strip()
+
+def verdict_cache_key(code_text: str) -> str:
+    """
+    Ключ кэша ответа модели: хэш модели, версии промпта и кода.
+
+    Args:
+        code_text (str): Код
+
+    Returns:
+        str: Ключ кэша
+    """
+    return hashlib.sha256(f"{MODEL_NAME}\0{PROMPT_VERSION}\0{code_text}".encode("utf-8")).hexdigest()
+
+def estimate_tokens(text: str) -> int:
+    """
+    Приблизительное количество токенов в тексте (около 4 символов на токен для кода).
+
+    Args:
+        text (str): Текст
+
+    Returns:
+        int: Оценка количества токенов
+    """
+    return len(text) // 4 + 1
+
+def split_lines(lines: List[str], budget: int) -> List[str]:
+    """
+    Разбиение строк на части не больше бюджета токенов.
+
+    Args:
+        lines (List[str]): Строки кода
+        budget (int): Бюджет токенов одной части
+
+    Returns:
+        List[str]: Части кода
+    """
+    parts, current, size = [], [], 0
+    for line in lines:
+        tokens = estimate_tokens(line)
+        if current and size + tokens > budget:
+            parts.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+    if current:
+        parts.append("".join(current))
+    return parts
+
+def split_code(code_text: str, budget: int = CODE_TOKEN_BUDGET) -> List[str]:
+    """
+    Разбиение большого файла на части по границам верхнеуровневых функций и классов.
+    Соседние блоки объединяются, пока часть укладывается в бюджет токенов;
+    блок больше бюджета делится по строкам.
+
+    Args:
+        code_text (str): Код файла
+        budget (int): Бюджет токенов одной части
+
+    Returns:
+        List[str]: Части кода (один элемент, если файл укладывается в бюджет)
+    """
+    if estimate_tokens(code_text) <= budget:
+        return [code_text]
+
+    # Блоки начинаются с объявления на нулевом отступе; декораторы относятся к следующему объявлению
+    blocks, current = [], []
+    for line in code_text.splitlines(keepends=True):
+        if current and BLOCK_START.match(line) and not current[-1].startswith("@"):
+            blocks.append(current)
+            current = []
+        current.append(line)
+    if current:
+        blocks.append(current)
+
+    parts, current, size = [], [], 0
+    for block in blocks:
+        for piece in split_lines(block, budget):
+            tokens = estimate_tokens(piece)
+            if current and size + tokens > budget:
+                parts.append("".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += tokens
+    if current:
+        parts.append("".join(current))
+    return parts
+
+def pack_batches(units: List[Dict], budget: int = CODE_TOKEN_BUDGET) -> List[List[Dict]]:
+    """
+    Упаковка фрагментов кода в запросы так, чтобы код в одном запросе укладывался в бюджет токенов.
+    Мелкие файлы попадают в один запрос и делят между собой инструкцию промпта.
+
+    Args:
+        units (List[Dict]): Фрагменты кода (словари с ключами name и code)
+        budget (int): Бюджет токенов кода в одном запросе
+
+    Returns:
+        List[List[Dict]]: Фрагменты, сгруппированные по запросам
+    """
+    batches, current, size = [], [], 0
+    for unit in units:
+        tokens = estimate_tokens(unit['code'])
+        if current and size + tokens > budget:
+            batches.append(current)
+            current, size = [], 0
+        current.append(unit)
+        size += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def analyze_batch(batch: List[Dict], reasks: int = MAX_REASKS) -> List[tuple]:
+    """
+    Анализ группы фрагментов кода одним запросом к модели со схемой ответа.
+    Ответ по каждому фрагменту проверяется моделью FileVerdict; переспрашиваются
+    только фрагменты, не прошедшие проверку, а не весь отчет.
+
+    Args:
+        batch (List[Dict]): Фрагменты кода (словари с ключами name и code)
+        reasks (int): Сколько раз еще можно переспросить модель
+
+    Returns:
+        List[tuple]: Пары (фрагмент, результат анализа или None, если ответ так и не прошел проверку)
+    """
+    names = [unit['name'] for unit in batch]
+    try:
+        result = mistral_analyze(make_prompt({unit['name']: unit['code'] for unit in batch}), schema=batch_schema(names))
+    except OllamaUnavailableError as e:
+        # серверы уже опрошены с повторами: фрагменты остаются без результата, отчет продолжается
+        logger.error(f"Фрагменты {names} не проанализированы: {e}")
+        return [(unit, None) for unit in batch]
+    except (json.JSONDecodeError, OllamaError) as e:
+        # ошибка модели в ответе обрабатывается как ответ, не прошедший проверку
+        logger.warning(f"Не удалось получить ответ модели ({e})")
+        result = {}
+
+    verdicts = []
+    failed = []
+    for unit in batch:
+        verdict = parse_file_verdict(result.get(unit['name']) if isinstance(result, dict) else None)
+        if verdict is None:
+            failed.append(unit)
+        else:
+            verdicts.append((unit, verdict))
+
+    for unit in failed:
+        if reasks > 0:
+            logger.warning(f"Ответ модели для {unit['name']} не соответствует схеме, повторный запрос")
+            verdicts.extend(analyze_batch([unit], reasks - 1))
+        else:
+            logger.error(f"Не удалось получить корректный ответ модели для {unit['name']}")
+            verdicts.append((unit, None))
+    return verdicts
+
+def merge_verdicts(parts: List[tuple]) -> dict:
+    """
+    Объединение результатов анализа частей одного файла.
+    Оценки усредняются с весом по размеру части, тексты объединяются.
+
+    Args:
+        parts (List[tuple]): Пары (результат анализа части, размер части)
+
+    Returns:
+        dict: Результат анализа файла или None, если ни одна часть не проанализирована
+    """
+    parts = [(verdict, size) for verdict, size in parts if verdict is not None]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0][0]
+
+    total = sum(size for _, size in parts) or 1
+    merged = {}
+    for criterion in CRITERIA:
+        items = [(verdict.get(criterion, {}), size) for verdict, size in parts]
+        examples = []
+        for item, _ in items:
+            value = item.get("examples") or []
+            examples.extend(value if isinstance(value, list) else [value])
+        merged[criterion] = {
+            "score": round(sum(item.get("score", 10) * size for item, size in items) / total),
+            "comment": " ".join(str(item["comment"]) for item, _ in items if item.get("comment")),
+            "examples": examples,
+            "suggestions": "\n".join(str(item["suggestions"]) for item, _ in items if item.get("suggestions")),
+            "solution": "\n".join(str(item["solution"]) for item, _ in items if item.get("solution")),
+            "legacy_context": any(item.get("legacy_context") for item, _ in items),
+            "forced_solution": any(item.get("forced_solution") for item, _ in items),
+        }
+    return merged
+
+def analyze_files(
+    files: Dict[str, str],
+    parallel: int = OLLAMA_NUM_PARALLEL,
+    budget: int = CODE_TOKEN_BUDGET,
+    use_cache: bool = True,
+    executor: Optional[ThreadPoolExecutor] = None
+) -> Dict[str, dict]:
+    """
+    Анализ файлов на наличие антипаттернов и код смеллов.
+    Большие файлы делятся на части по функциям и классам, мелкие упаковываются
+    в общие запросы до бюджета токенов. Результат для каждого фрагмента кэшируется
+    по хэшу модели, версии промпта и кода, поэтому одинаковый код из разных PR
+    и пересекающихся отчетов анализируется моделью один раз.
+
+    Args:
+        files (Dict[str, str]): Имя файла -> код
+        parallel (int): Количество одновременных запросов к модели
+        budget (int): Бюджет токенов кода в одном запросе
+        use_cache (bool): Использовать кэш ответов модели
+        executor (Optional[ThreadPoolExecutor]): Общая очередь запросов к модели для нескольких
+            одновременных анализов (тогда parallel не используется)
+
+    Returns:
+        Dict[str, dict]: Имя файла -> результат анализа в виде JSON-а
+            (None, если модель так и не вернула корректный ответ)
+    """
+    cache = get_llm_cache() if use_cache else None
+
+    units = []
+    for name, code in files.items():
+        chunks = split_code(code, budget)
+        for i, chunk in enumerate(chunks, 1):
+            units.append({
+                'file': name,
+                'name': name if len(chunks) == 1 else f"{name} (part {i}/{len(chunks)})",
+                'code': chunk,
+                'key': verdict_cache_key(chunk),
+            })
+
+    verdicts = {}
+    pending = {}
+    for unit in units:
+        cached = cache.get(unit['key']) if cache is not None else None
+        if cached is not None:
+            verdicts[unit['key']] = json.loads(cached)
+        else:
+            # одинаковый код отправляется в модель один раз
+            pending.setdefault(unit['key'], unit)
+
+    batches = pack_batches(list(pending.values()), budget)
+    logger.info(f"Анализ {len(files)} файлов: {len(units)} фрагментов, из кэша {len(units) - len(pending)}, запросов к модели {len(batches)}")
+
+    pool = executor or ThreadPoolExecutor(max_workers=parallel)
+    try:
+        for batch_verdicts in pool.map(propagate(analyze_batch), batches):
+            for unit, verdict in batch_verdicts:
+                verdicts[unit['key']] = verdict
+                if cache is not None and verdict is not None:
+                    cache.set(unit['key'], json.dumps(verdict, ensure_ascii=False))
+    finally:
+        if executor is None:
+            pool.shutdown()
 
-    return json.loads(response.json()['response'], cls=LazyDecoder)
\ No newline at end of file
+    return {
+        name: merge_verdicts([(verdicts[unit['key']], len(unit['code'])) for unit in units if unit['file'] == name])
+        for name in files
+    }
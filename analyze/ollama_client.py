@@ -0,0 +1,299 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics_work import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Адреса серверов Ollama через запятую, например "http://gpu1:11434,http://gpu2:11434"
+OLLAMA_HOSTS = os.getenv("OLLAMA_HOSTS", "http://localhost:11434")
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+# Генерация длинного ответа на CPU/GPU может занимать минуты
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "600"))
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", "3"))
+# Сколько секунд не отправлять запросы на сервер после ошибки
+HOST_COOLDOWN = 30
+# Границы гистограммы скорости генерации, токенов в секунду
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_client = None
+_client_lock = threading.Lock()
+
+class OllamaError(Exception):
+    """
+    Ошибка запроса к Ollama (например, ошибка модели в потоке ответа)
+    """
+
+class OllamaUnavailableError(OllamaError):
+    """
+    Ни один сервер Ollama не ответил после всех повторов
+    """
+
+class JsonObjectScanner:
+    """
+    Инкрементальный поиск конца первого JSON-объекта верхнего уровня в потоке текста.
+    Учитывает вложенность скобок и строки с экранированием, поэтому скобки внутри строк не мешают.
+    """
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        # позиция начала объекта (текст модели до него отбрасывается)
+        self.start = 0
+        self.in_string = False
+        self.escape = False
+        self.length = 0
+
+    def feed(self, text: str) -> Optional[int]:
+        """
+        Обработка очередного фрагмента текста.
+
+        Args:
+            text (str): Фрагмент ответа модели.
+
+        Returns:
+            Optional[int]: Длина текста (с начала потока) до конца объекта включительно,
+                если объект завершился в этом фрагменте, иначе None.
+        """
+        for i, char in enumerate(text):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.started:
+                self.in_string = True
+            elif char == '{':
+                if not self.started:
+                    self.started = True
+                    self.start = self.length + i
+                self.depth += 1
+            elif char == '}' and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return self.length + i + 1
+        self.length += len(text)
+        return None
+
+class OllamaClient:
+    """
+    HTTP-клиент Ollama с пулом keep-alive соединений, таймаутами, повторами с экспоненциальной
+    задержкой и распределением запросов между несколькими серверами.
+    Запрос отправляется на сервер с наименьшим числом выполняющихся запросов;
+    сервер, вернувший ошибку соединения или 5xx, временно исключается.
+    """
+    def __init__(
+        self,
+        hosts: List[str],
+        connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+        read_timeout: float = OLLAMA_READ_TIMEOUT,
+        retries: int = OLLAMA_RETRIES,
+        backoff: float = 1.0,
+        pool_size: int = 10
+    ):
+        """
+        Args:
+            hosts (List[str]): Адреса серверов Ollama.
+            connect_timeout (float): Таймаут соединения в секундах.
+            read_timeout (float): Таймаут ожидания ответа в секундах.
+            retries (int): Количество повторов после ошибки.
+            backoff (float): Базовая задержка перед повтором (удваивается с каждой попыткой).
+            pool_size (int): Размер пула соединений на сервер.
+        """
+        if not hosts:
+            raise ValueError("Не указан ни один сервер Ollama")
+        self.hosts = [host.rstrip('/') for host in hosts]
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._in_flight = {host: 0 for host in self.hosts}
+        self._failed_until = {host: 0.0 for host in self.hosts}
+        self._next = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.hosts), pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _acquire_host(self) -> str:
+        """
+        Выбор сервера с наименьшей нагрузкой среди доступных (при равенстве - по кругу).
+        """
+        with self._lock:
+            now = time.time()
+            available = [host for host in self.hosts if self._failed_until[host] <= now] or self.hosts
+            start = self._next
+            self._next = (self._next + 1) % len(self.hosts)
+            ordered = sorted(
+                available,
+                key=lambda host: (self._in_flight[host], (self.hosts.index(host) - start) % len(self.hosts))
+            )
+            host = ordered[0]
+            self._in_flight[host] += 1
+            return host
+
+    def _release_host(self, host: str, failed: bool) -> None:
+        with self._lock:
+            self._in_flight[host] -= 1
+            if failed:
+                self._failed_until[host] = time.time() + HOST_COOLDOWN
+
+    def post(self, path: str, payload: dict, handler: Optional[Callable] = None):
+        """
+        POST-запрос к одному из серверов с повторами.
+
+        Args:
+            path (str): Путь API, например /api/generate.
+            payload (dict): Тело запроса.
+            handler (Optional[Callable]): Обработчик потокового ответа; если задан, ответ читается
+                потоком, а сервер считается занятым, пока обработчик не завершится.
+
+        Returns:
+            Успешный ответ сервера (requests.Response) или результат обработчика.
+        """
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            host = self._acquire_host()
+            failed = False
+            try:
+                response = self.session.post(
+                    f"{host}{path}", json=payload, timeout=self.timeout, stream=handler is not None
+                )
+                if response.status_code >= 500:
+                    failed = True
+                    last_error = f"{host} вернул {response.status_code}: {response.text[:200]}"
+                    logger.warning(f"Ошибка Ollama ({last_error}), попытка {attempt + 1}/{self.retries + 1}")
+                    continue
+                response.raise_for_status()
+                if handler is not None:
+                    with response:
+                        return handler(response)
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                failed = True
+                last_error = f"{host}: {e}"
+                logger.warning(f"Нет ответа от Ollama ({last_error}), попытка {attempt + 1}/{self.retries + 1}")
+            finally:
+                self._release_host(host, failed)
+        raise OllamaUnavailableError(f"Ollama недоступна: {last_error}")
+
+    def generate(self, prompt: str, model: str, **options) -> dict:
+        """
+        Генерация ответа модели (/api/generate без потоковой передачи).
+
+        Args:
+            prompt (str): Промпт.
+            model (str): Название модели.
+            **options: Дополнительные поля запроса Ollama.
+
+        Returns:
+            dict: Ответ Ollama.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": False, **options}
+        return self.post("/api/generate", payload).json()
+
+    def generate_stream(self, prompt: str, model: str, stop_after_json: bool = True, **options) -> dict:
+        """
+        Генерация ответа модели с потоковой передачей (NDJSON).
+        Если ответ - JSON-объект, генерация прерывается сразу после его завершения:
+        закрытие соединения останавливает генерацию на сервере Ollama, лишние токены не вычисляются.
+
+        Args:
+            prompt (str): Промпт.
+            model (str): Название модели.
+            stop_after_json (bool): Прерывать генерацию после первого завершенного JSON-объекта.
+            **options: Дополнительные поля запроса Ollama.
+
+        Returns:
+            dict: Ответ ("response") и метрики: ttft (время до первого токена, с),
+                tokens (количество токенов), prompt_eval_count (токенов в промпте; None, если генерация
+                остановлена досрочно), tokens_per_second, duration (с), stopped_early.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True, **options}
+
+        def read_stream(response: requests.Response) -> dict:
+            started = time.time()
+            first_token_at = None
+            scanner = JsonObjectScanner()
+            parts = []
+            tokens = 0
+            prompt_tokens = None
+            json_complete = False
+            stopped_early = False
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise OllamaError(chunk["error"])
+                text = chunk.get("response", "")
+                if text:
+                    tokens += 1
+                    if first_token_at is None:
+                        first_token_at = time.time()
+                    end = scanner.feed(text) if stop_after_json else None
+                    if end is not None:
+                        parts.append(text[:end - scanner.length])
+                        json_complete = True
+                        stopped_early = not chunk.get("done")
+                        break
+                    parts.append(text)
+                if chunk.get("done"):
+                    # сервер сообщает точное количество токенов
+                    tokens = chunk.get("eval_count", tokens)
+                    prompt_tokens = chunk.get("prompt_eval_count")
+                    break
+
+            finished = time.time()
+            generation_time = finished - (first_token_at or finished)
+            text = "".join(parts)
+            return {
+                # если JSON-объект найден, текст модели до него отбрасывается
+                "response": text[scanner.start:] if json_complete else text,
+                "ttft": (first_token_at or finished) - started,
+                "tokens": tokens,
+                "prompt_eval_count": prompt_tokens,
+                "tokens_per_second": tokens / generation_time if generation_time > 0 else 0.0,
+                "duration": finished - started,
+                "stopped_early": stopped_early,
+            }
+
+        result = self.post("/api/generate", payload, handler=read_stream)
+        METRICS.observe("code_review_llm_ttft_seconds", result['ttft'], "Время до первого токена ответа модели, с")
+        METRICS.observe("code_review_llm_tokens_per_second", result['tokens_per_second'],
+                        "Скорость генерации ответа модели, токенов в секунду", buckets=TOKENS_PER_SECOND_BUCKETS)
+        if result['stopped_early']:
+            METRICS.inc("code_review_llm_stopped_early_total",
+                        help_text="Ответы модели, генерация которых остановлена после завершения JSON")
+        logger.info(
+            f"Ответ модели: до первого токена {result['ttft']:.2f} с, {result['tokens']} токенов, "
+            f"{result['tokens_per_second']:.1f} ток/с"
+            + (", генерация остановлена после JSON" if result['stopped_early'] else "")
+        )
+        return result
+
+def get_ollama_client() -> OllamaClient:
+    """
+    Возвращает общий для процесса клиент Ollama, настроенный по переменным окружения.
+
+    Returns:
+        OllamaClient: Клиент Ollama.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            hosts = [host.strip() for host in OLLAMA_HOSTS.split(',') if host.strip()]
+            _client = OllamaClient(hosts)
+        return _client
@@ -1,168 +1,244 @@
-import subprocess
-import json
-from pathlib import Path
+import math
 import os
-from typing import List, Dict
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
 import logging
 
+from bandit.core import config as bandit_config
+from bandit.core import manager as bandit_manager
+from flake8.api import legacy as flake8_api
+from flake8.formatting.base import BaseFormatter
+from flake8.main.options import JobsArgument
+
+from utils.diff_work import get_added_lines, locate_changed_lines
+from utils.metrics_work import run_timed, record_future
+
 logger = logging.getLogger(__name__)
 
-def stat_analyze_diff(diff: str) -> None:
+# Количество процессов статического анализа (анализ идет параллельно с запросами к модели)
+STATIC_ANALYSIS_WORKERS = int(os.getenv("STATIC_ANALYSIS_WORKERS", "2"))
+
+class _CollectingFormatter(BaseFormatter):
+    """
+    Форматтер flake8, который собирает нарушения в список violations класса вместо вывода в консоль.
+    flake8 сам создает экземпляр форматтера, поэтому для каждого запуска создается подкласс
+    со своим списком (см. run_flake8)
+    """
+    violations: List = []
+
+    def handle(self, error) -> None:
+        self.violations.append(error)
+
+    def format(self, error) -> None:
+        return None
+
+def stat_analyze_diffs(diffs: List[Dict]) -> Dict[int, Dict]:
     """
-    Анализирует диффы с помощью flake8 и bandit, сохраняет результаты в JSON.
-    
+    Анализирует диффы всех PR отчета с помощью flake8 и bandit за один проход.
+    Проверяются полные версии измененных файлов после мерджа PR (папка source_dir из get_diffs),
+    а не фрагменты ханков, которые вне контекста часто не разбираются анализаторами.
+    Анализаторы выбираются по расширению файла (файлы на неподдерживаемых языках пропускаются)
+    и запускаются в текущем процессе сразу на всех файлах.
+    В результат попадают только проблемы в строках, добавленных автором; файлы, содержимое которых
+    получить не удалось, перечисляются в not_analyzed_files.
+
     Args:
-        diffs_data: Список словарей с информацией о PR (результат работы get_diffs)
+        diffs: Список словарей с информацией о PR (результат работы get_diffs)
+    Returns:
+        Номер PR -> результат анализа (словарь с ключами flake8_issues, bandit_issues и not_analyzed_files)
     """
-    pr_number = diff['pr_number']
-    diff_path = diff['diff_path']
-    
-    try:
-        if not os.path.exists(diff_path):
+    results = {}
+    # путь файла на диске -> (номер PR, путь файла в репозитории, номера добавленных строк)
+    sources = {}
+    for diff in diffs:
+        pr_number = diff['pr_number']
+        diff_path = diff['diff_path']
+        if not diff_path or not os.path.exists(diff_path):
             logger.warning(f"Файл диффа {diff_path} для PR #{pr_number} не найден")
-        else:  
-            # Анализ с flake8
-            flake8_result = run_flake8_analysis(diff_path)
-            
-            # Анализ с bandit
-            bandit_result = run_bandit_analysis(diff_path)
-            
-            # Формируем результат
-            analysis_result = {
-                'pr_number': pr_number,
-                'title': diff['title'],
-                'merged_at': diff['merged_at'],
-                'author': diff['author'],
-                'commit_sha': diff['commit_sha'],
-                'flake8_issues': flake8_result,
-                'bandit_issues': bandit_result,
-                'github_url': f"https://github.com/{diff.get('repo_owner', '')}/{diff.get('repo_name', '')}/pull/{pr_number}"
-            }
-            
-            logger.info(f"Анализ PR #{pr_number} завершен: {len(flake8_result)} issues flake8, {len(bandit_result)} issues bandit")
-
-            return analysis_result
-            
-    except Exception as e:
-        logger.error(f"Ошибка при анализе PR #{pr_number}: {str(e)}")
+            continue
+        try:
+            pr_sources, not_analyzed = collect_source_files(diff_path, diff.get('source_dir'), pr_number)
+        except Exception as e:
+            logger.error(f"Ошибка при разборе диффа PR #{pr_number}: {str(e)}")
+            continue
+        if not_analyzed:
+            logger.warning(f"PR #{pr_number}: нет содержимого файлов после мерджа, не проанализированы: {not_analyzed}")
+        sources.update(pr_sources)
+        results[pr_number] = {
+            'pr_number': pr_number,
+            'title': diff['title'],
+            'merged_at': diff['merged_at'],
+            'author': diff['author'],
+            'commit_sha': diff['commit_sha'],
+            **{key: [] for key in ANALYZER_KEYS},
+            'not_analyzed_files': not_analyzed,
+            'github_url': f"https://github.com/{diff.get('repo_owner', '')}/{diff.get('repo_name', '')}/pull/{pr_number}"
+        }
 
+    # анализатор -> файлы, которые он проверяет
+    batches = {}
+    for path in sorted(sources):
+        for analyzer in ANALYZERS.get(Path(path).suffix.lower(), ()):
+            batches.setdefault(analyzer, []).append(path)
+
+    for (key, run), paths in batches.items():
+        for issue in run(paths):
+            source = sources.get(os.path.normpath(issue['file']))
+            if source is None:
+                continue
+            pr_number, filename, changed_lines = source
+            # проблемы в строках, которые автор не менял, к нему не относятся
+            if issue['line'] not in changed_lines:
+                continue
+            issue['file'] = filename
+            results[pr_number][key].append(issue)
+
+    for pr_number, result in results.items():
+        logger.info(
+            f"Анализ PR #{pr_number} завершен: {len(result['flake8_issues'])} issues flake8, "
+            f"{len(result['bandit_issues'])} issues bandit"
+        )
+    return results
 
-def extract_added_lines(diff_path: str) -> str:
+def submit_stat_analysis(executor: Executor, diffs: List[Dict], workers: int = STATIC_ANALYSIS_WORKERS) -> Dict[int, Future]:
     """
-    Извлекает только добавленные строки ('+') из .diff-файла.
-    
+    Отправляет статический анализ всех PR в пул процессов, не дожидаясь результата.
+    PR делятся на последовательные пачки (по две на процесс), поэтому результаты для первых PR
+    готовы раньше, а flake8 и bandit запускаются один раз на пачку.
+
     Args:
-        diff_path: Путь к файлу с диффом.
+        executor: Пул процессов.
+        diffs: Список словарей с информацией о PR (результат работы get_diffs)
+        workers: Количество процессов в пуле.
+    Returns:
+        Номер PR -> Future с результатом stat_analyze_diffs для пачки, в которую попал PR
+            (и временем анализа пачки, см. run_timed)
+    """
+    futures = {}
+    if not diffs:
+        return futures
+    chunk_size = math.ceil(len(diffs) / (max(workers, 1) * 2))
+    for start in range(0, len(diffs), chunk_size):
+        chunk = diffs[start:start + chunk_size]
+        # время анализа измеряется в процессе-исполнителе и записывается, когда пачка готова
+        future = executor.submit(run_timed, stat_analyze_diffs, chunk)
+        future.add_done_callback(record_future("static_analysis"))
+        for diff in chunk:
+            futures[diff['pr_number']] = future
+    return futures
+
+def get_stat_result(future: Optional[Future], pr_number: int) -> Optional[Dict]:
     """
-    added_lines = []
-    with open(diff_path, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            if line.startswith('+') and not line.startswith('+++'):
-                added_lines.append(line[1:])  # Убираем '+' в начале
-    return ''.join(added_lines)
-
-def run_flake8_analysis(diff_path: str) -> List[Dict]:
+    Ожидает результат статического анализа PR.
+
+    Args:
+        future: Future из submit_stat_analysis.
+        pr_number: Номер PR.
+    Returns:
+        Результат анализа или None, если анализ не удался
+    """
+    if future is None:
+        return None
+    try:
+        results, _ = future.result()
+        return results.get(pr_number)
+    except Exception as e:
+        logger.error(f"Ошибка при статическом анализе PR #{pr_number}: {str(e)}")
+        return None
+
+def collect_source_files(diff_path: str, source_dir: Optional[str], pr_number: int) -> Tuple[Dict[str, tuple], List[str]]:
     """
-    Анализирует только добавленный код с помощью flake8.
-    
+    Находит версии файлов после мерджа для файлов диффа, которые умеют проверять анализаторы,
+    и номера строк, добавленных автором, в этих версиях.
+
     Args:
         diff_path: Путь к файлу с диффом.
+        source_dir: Папка с файлами PR после мерджа (None - файлы не загружались).
+        pr_number: Номер PR.
+    Returns:
+        Путь файла на диске -> (номер PR, путь файла в репозитории, номера добавленных строк)
+            и пути файлов в репозитории, для которых нет содержимого после мерджа
+    """
+    sources = {}
+    not_analyzed = []
+    for filename, added in sorted(get_added_lines(diff_path).items()):
+        if not added or Path(filename).suffix.lower() not in ANALYZERS:
+            continue
+        path = Path(source_dir) / filename if source_dir else None
+        if path is None or not path.is_file():
+            not_analyzed.append(filename)
+            continue
+        changed_lines = locate_changed_lines(path.read_text(encoding='utf-8', errors='replace'), added)
+        if changed_lines:
+            sources[os.path.normpath(str(path))] = (pr_number, filename, changed_lines)
+    return sources, not_analyzed
+
+def run_flake8(paths: List[str]) -> List[Dict]:
+    """
+    Анализирует файлы с помощью flake8 в текущем процессе.
+
+    Args:
+        paths: Пути к файлам.
     Returns:
         Список словарей с информацией об ошибках и предупреждениях flake8.
     """
     try:
-        content = extract_added_lines(diff_path)
-        if not content:
-            return []
-
-        result = subprocess.run(
-            ['flake8', '--format=json', '--stdin-display-name', diff_path, '-'],
-            input=content,
-            capture_output=True,
-            text=True,
-            encoding='utf-8'
-        )
-        
-        if result.returncode == 0:
-            return []
-        
-        try:
-            # Парсим JSON вывод flake8
-            issues = json.loads(result.stdout)
-            return [
-                {
-                    'file': issue['filename'],
-                    'line': issue['line_number'],
-                    'column': issue['column_number'],
-                    'code': issue['code'],
-                    'message': issue['text'],
-                    'severity': 'style'
-                }
-                for issue in issues
-            ]
-        except json.JSONDecodeError:
-            logger.warning(f"Не удалось распарсить вывод flake8 для {diff_path}")
-            return []
-            
+        violations = []
+        formatter = type("Formatter", (_CollectingFormatter,), {"violations": violations})
+        style_guide = flake8_api.get_style_guide(jobs=JobsArgument("1"))
+        style_guide.init_report(formatter)
+        style_guide.check_files(paths)
     except Exception as e:
-        logger.error(f"Ошибка при запуске flake8 для {diff_path}: {str(e)}")
+        logger.error(f"Ошибка при запуске flake8: {str(e)}")
         return []
 
-def run_bandit_analysis(diff_path: str) -> List[Dict]:
+    return [
+        {
+            'file': violation.filename,
+            'line': violation.line_number,
+            'column': violation.column_number,
+            'code': violation.code,
+            'message': violation.text,
+            'severity': 'style'
+        }
+        for violation in violations
+    ]
+
+def run_bandit(paths: List[str]) -> List[Dict]:
     """
-    Запускает bandit для анализа безопасности кода и возвращает результаты.
-    
+    Анализирует файлы с помощью bandit в текущем процессе.
+
     Args:
-        diff_path: Путь к файлу с диффом.
+        paths: Пути к файлам.
     Returns:
         Список словарей с информацией об ошибках безопасности.
     """
     try:
-        # Создаем временный файл для анализа, так как bandit не поддерживает stdin
-        temp_file = Path(diff_path).with_suffix('.py')
-        try:
-            # Пытаемся извлечь только добавленные строки (начинающиеся с '+')
-            with open(diff_path, 'r', encoding='utf-8') as f:
-                added_lines = [
-                    line[1:] for line in f 
-                    if line.startswith('+') and not line.startswith('+++')
-                ]
-            
-            temp_file.write_text('\n'.join(added_lines), encoding='utf-8')
-            
-            # Запускаем bandit с форматированием вывода в JSON
-            result = subprocess.run(
-                ['bandit', '-f', 'json', '-q', '-n', '1', str(temp_file)],
-                capture_output=True,
-                text=True,
-                encoding='utf-8'
-            )
-            
-            if result.returncode == 0:
-                return []
-            
-            try:
-                # Парсим JSON вывод bandit
-                report = json.loads(result.stdout)
-                return [
-                    {
-                        'file': diff_path,
-                        'line': issue['line_range'][0] if issue['line_range'] else 0,
-                        'code': issue['test_id'],
-                        'message': issue['issue_text'],
-                        'severity': issue['issue_severity'],
-                        'confidence': issue['issue_confidence']
-                    }
-                    for issue in report.get('results', [])
-                ]
-            except json.JSONDecodeError:
-                logger.warning(f"Не удалось распарсить вывод bandit для {diff_path}")
-                return []
-                
-        finally:
-            if temp_file.exists():
-                temp_file.unlink()
-                
+        manager = bandit_manager.BanditManager(bandit_config.BanditConfig(), 'file', quiet=True)
+        manager.discover_files(paths)
+        manager.run_tests()
+        issues = manager.get_issue_list()
     except Exception as e:
-        logger.error(f"Ошибка при запуске bandit для {diff_path}: {str(e)}")
-        return []
\ No newline at end of file
+        logger.error(f"Ошибка при запуске bandit: {str(e)}")
+        return []
+
+    return [
+        {
+            'file': issue.fname,
+            'line': issue.lineno,
+            'code': issue.test_id,
+            'message': issue.text,
+            'severity': issue.severity,
+            'confidence': issue.confidence
+        }
+        for issue in issues
+    ]
+
+# Расширение файла -> анализаторы (ключ результата, функция анализа списка файлов)
+ANALYZERS = {
+    '.py': (('flake8_issues', run_flake8), ('bandit_issues', run_bandit)),
+}
+ANALYZER_KEYS = ('flake8_issues', 'bandit_issues')
+# Версия статического анализа: входит в ключ кэша записей PR, старые записи пересчитываются
+STATIC_ANALYSIS_VERSION = "2"
@@ -0,0 +1,134 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+CRITERIA = ("CodeSmells", "AntiPatterns", "LegacyCompatibility")
+
+class CriterionVerdict(BaseModel):
+    """
+    Оценка кода по одному критерию
+    """
+    score: int = Field(ge=0, le=10)
+    comment: str = ""
+    examples: List[str] = []
+    suggestions: str = ""
+    solution: str = ""
+    legacy_context: bool = False
+    forced_solution: bool = False
+
+    @field_validator("examples", mode="before")
+    @classmethod
+    def examples_to_list(cls, value):
+        """
+        Модель может вернуть один пример строкой вместо списка
+        """
+        if value is None or value == "":
+            return []
+        if isinstance(value, str):
+            return [value]
+        return value
+
+class FileVerdict(BaseModel):
+    """
+    Результат анализа файла моделью по всем критериям
+    """
+    CodeSmells: CriterionVerdict
+    AntiPatterns: CriterionVerdict
+    LegacyCompatibility: CriterionVerdict
+
+class OverallReview(BaseModel):
+    """
+    Итоговый обзор разработчика
+    """
+    strengths: str
+    improvements: str
+    recommendations: str
+
+class ReviewVerdict(BaseModel):
+    """
+    Ответ модели с итоговым обзором
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    overall_review: OverallReview = Field(alias="Overall Review")
+
+def _object_schema(properties: Dict[str, dict]) -> dict:
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+    }
+
+def criterion_schema() -> dict:
+    """
+    JSON-схема оценки по одному критерию (без ссылок $ref, чтобы ее понимал генератор грамматики Ollama)
+    Returns:
+        dict: JSON-схема
+    """
+    return _object_schema({
+        "score": {"type": "integer", "minimum": 0, "maximum": 10},
+        "comment": {"type": "string"},
+        "examples": {"type": "array", "items": {"type": "string"}},
+        "suggestions": {"type": "string"},
+        "solution": {"type": "string"},
+        "legacy_context": {"type": "boolean"},
+        "forced_solution": {"type": "boolean"},
+    })
+
+def file_verdict_schema() -> dict:
+    """
+    JSON-схема результата анализа одного файла
+    Returns:
+        dict: JSON-схема
+    """
+    return _object_schema({criterion: criterion_schema() for criterion in CRITERIA})
+
+def batch_schema(names: List[str]) -> dict:
+    """
+    JSON-схема ответа на промпт с несколькими файлами: имя файла -> результат анализа
+    Args:
+        names: имена файлов в промпте
+    Returns:
+        dict: JSON-схема
+    """
+    return _object_schema({name: file_verdict_schema() for name in names})
+
+def review_schema() -> dict:
+    """
+    JSON-схема итогового обзора разработчика
+    Returns:
+        dict: JSON-схема
+    """
+    return _object_schema({
+        "Overall Review": _object_schema({
+            "strengths": {"type": "string"},
+            "improvements": {"type": "string"},
+            "recommendations": {"type": "string"},
+        })
+    })
+
+def parse_file_verdict(data) -> Optional[dict]:
+    """
+    Проверка результата анализа файла
+    Args:
+        data: ответ модели для файла
+    Returns:
+        dict: проверенный результат или None, если ответ не соответствует схеме
+    """
+    try:
+        return FileVerdict.model_validate(data).model_dump()
+    except ValidationError:
+        return None
+
+def parse_review(data) -> Optional[dict]:
+    """
+    Проверка итогового обзора
+    Args:
+        data: ответ модели
+    Returns:
+        dict: проверенный обзор в формате {"Overall Review": {...}} или None
+    """
+    try:
+        return ReviewVerdict.model_validate(data).model_dump(by_alias=True)
+    except ValidationError:
+        return None
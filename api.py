@@ -1,18 +1,82 @@
 from fastapi import FastAPI, HTTPException, Header
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
-from main import form_report  # Импортируем вашу функцию
+from typing import List, Literal, Optional
+from main import build_report, build_multi_repo_report  # Импортируем вашу функцию
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from report_model import REPORT_FORMATS, Report
+from report_jobs import ReportJobs, get_report_cache, DONE, FAILED
+from utils.metrics_work import METRICS
+from download_repo import get_merged_prs_fingerprint, list_owner_repos
+from github_client import RateLimitScheduler
+from analyze.mistral_analyze import MODEL_NAME, PROMPT_VERSION
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # кэш отчетов открывается при запуске сервера, а не при импорте модуля
+    jobs.cache = get_report_cache()
+    yield
 
 # Инициализация приложения
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Загрузка переменных окружения
 load_dotenv()
 
+# Общий пул для отпечатков репозиториев отчетов по нескольким репозиториям (запросы идут одновременно)
+FINGERPRINT_WORKERS = int(os.getenv("FINGERPRINT_WORKERS", "8"))
+fingerprint_pool = ThreadPoolExecutor(max_workers=FINGERPRINT_WORKERS, thread_name_prefix="fingerprint")
+
+def report_fingerprint(params: dict) -> str:
+    """
+    Отпечаток данных отчета: смердженные PR в окне, модель и версия промпта
+    """
+    if "github_urls" in params:
+        # отчет по нескольким репозиториям: отпечатки всех репозиториев, включая репозитории организаций
+        scheduler = RateLimitScheduler()
+        access_token = params.get("access_token")
+        repositories = list(params["github_urls"])
+        for owner_repos in fingerprint_pool.map(
+            lambda org: list_owner_repos(org, access_token, scheduler=scheduler), params.get("orgs") or []
+        ):
+            repositories += owner_repos
+        repositories = sorted(set(url.rstrip('/') for url in repositories))
+        fingerprints = fingerprint_pool.map(
+            lambda url: get_merged_prs_fingerprint(
+                url, params['start_date'], params['end_date'], access_token, scheduler=scheduler
+            ),
+            repositories
+        )
+        prs = hashlib.sha256("\n".join(
+            f"{url}:{fingerprint}" for url, fingerprint in zip(repositories, fingerprints)
+        ).encode()).hexdigest()
+    else:
+        prs = get_merged_prs_fingerprint(
+            params["github_url"], params["start_date"], params["end_date"], params.get("access_token")
+        )
+    return f"{MODEL_NAME}:{PROMPT_VERSION}:{prs}"
+
+def run_report(progress=None, **params) -> Report:
+    """
+    Данные отчета по параметрам задачи: по одному репозиторию или по нескольким
+    (формат вывода выбирает очередь задач, см. ReportJobs)
+    """
+    if "github_urls" in params:
+        return build_multi_repo_report(**params, progress=progress)
+    return build_report(**params, progress=progress)
+
+# Очередь задач формирования отчетов (одинаковые запросы объединяются, готовые отчеты кэшируются;
+# кэш подключается при запуске сервера, см. lifespan)
+jobs = ReportJobs(run_report, fingerprint=report_fingerprint)
+
+# Допустимые форматы отчета (ключи REPORT_FORMATS)
+ReportFormat = Literal[tuple(REPORT_FORMATS)]
+
 # Модель запроса
 class ReportRequest(BaseModel):
     github_url: str
@@ -20,34 +84,105 @@ class ReportRequest(BaseModel):
     start_date: datetime
     end_date: datetime
     access_token: Optional[str] = None
+    # формат отчета: pdf, json, html или docx
+    format: ReportFormat = "pdf"
 
-@app.post("/generate-report")
-async def generate_report(
-    request: ReportRequest,
-    authorization: Optional[str] = Header(None)
-):
+# Модель запроса отчета по нескольким репозиториям
+class MultiRepoReportRequest(BaseModel):
+    # ссылки на репозитории
+    github_urls: List[str] = []
+    # организации или пользователи GitHub, все репозитории которых (кроме форков) входят в отчет
+    orgs: List[str] = []
+    email: str
+    start_date: datetime
+    end_date: datetime
+    access_token: Optional[str] = None
+    format: ReportFormat = "pdf"
+
+def get_access_token(request_token: Optional[str], authorization: Optional[str]) -> Optional[str]:
     # Получаем токен из: тела запроса, заголовка или переменных окружения
-    access_token = (
-        request.access_token or
+    return (
+        request_token or
         (authorization.split(" ")[1] if authorization and authorization.startswith("Bearer ") else None) or
         os.getenv("GITHUB_TOKEN")
     )
+
+@app.post("/generate-report", status_code=202)
+async def generate_report(
+    request: ReportRequest,
+    authorization: Optional[str] = Header(None)
+):
+    access_token = get_access_token(request.access_token, authorization)
     
-    try:
-        report_path = form_report(
-            github_url=request.github_url,
-            email=request.email,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            access_token=access_token
-        )
-        return FileResponse(
-            report_path,
-            filename=os.path.basename(report_path),  # Имя файла для клиента
-            media_type="application/pdf"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    # Отчет формируется в фоне, клиент сразу получает id задачи
+    job_id = jobs.submit(
+        github_url=request.github_url,
+        email=request.email,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        access_token=access_token,
+        report_format=request.format
+    )
+    return {"job_id": job_id, "status_url": f"/jobs/{job_id}", "report_url": f"/jobs/{job_id}/report"}
+
+@app.post("/generate-multi-repo-report", status_code=202)
+async def generate_multi_repo_report(
+    request: MultiRepoReportRequest,
+    authorization: Optional[str] = Header(None)
+):
+    if not request.github_urls and not request.orgs:
+        raise HTTPException(status_code=422, detail="Укажите github_urls или orgs")
+    access_token = get_access_token(request.access_token, authorization)
+
+    # один отчет по всем репозиториям: репозитории загружаются одновременно в фоновой задаче
+    job_id = jobs.submit(
+        github_urls=request.github_urls,
+        orgs=request.orgs,
+        email=request.email,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        access_token=access_token,
+        report_format=request.format
+    )
+    return {"job_id": job_id, "status_url": f"/jobs/{job_id}", "report_url": f"/jobs/{job_id}/report"}
+
+@app.get("/stats")
+async def get_stats():
+    # объединение одинаковых запросов и попадания в кэш отчетов
+    return jobs.get_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # метрики в формате Prometheus: время этапов, токены модели, запросы к GitHub, очередь задач
+    for status, count in jobs.get_status_counts().items():
+        METRICS.set("code_review_jobs", count, "Задачи формирования отчетов по статусам", status=status)
+    for name, value in jobs.get_stats().items():
+        METRICS.set(f"code_review_jobs_{name}", value, "Объединение запросов и кэш отчетов")
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    # путь к файлу на сервере клиенту не нужен
+    job.pop("report_path")
+    return job
+
+@app.get("/jobs/{job_id}/report")
+async def get_job_report(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=400, detail=job["error"])
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Отчет еще формируется: {job['stage']}")
+    return FileResponse(
+        job["report_path"],
+        filename=os.path.basename(job["report_path"]),  # Имя файла для клиента
+        media_type=REPORT_FORMATS[job["format"]][1]
+    )
 
 # Для запуска через python api.py
 if __name__ == "__main__":
@@ -0,0 +1 @@
+# Корень репозитория в sys.path, чтобы тесты импортировали модули и при запуске через "pytest tests"
@@ -1,16 +1,57 @@
-from github import Github, GithubException
 from datetime import datetime, timezone
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Iterable
 import logging
 import os
 from pathlib import Path
-import requests
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import json
+import hashlib
+import base64
+from urllib.parse import quote
+
+from git import GitCommandError
+
+from github_client import GithubClient, GithubApiError, RateLimitScheduler, get_etag_cache
+from utils.cache_work import SqliteCache
+from utils.git_work import sync_mirror, list_pr_commits, get_local_commit_files, get_local_file_content
+from utils.metrics_work import timed, propagate, count
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Размер страницы для списков GitHub API (максимум, который разрешает GitHub)
+PER_PAGE = 100
+# Поиск GitHub отдает не более 1000 результатов на запрос
+SEARCH_RESULTS_LIMIT = 1000
+# Количество одновременных запросов к GitHub API по умолчанию
+MAX_WORKERS = 4
+# Минимальный интервал между запросами: держит общий темп ниже вторичных лимитов GitHub
+# (не более ~900 запросов в минуту)
+SECONDS_BETWEEN_REQUESTS = 0.1
+# Кэш патчей коммитов: содержимое коммита неизменно, поэтому ключом служит SHA
+COMMIT_CACHE_PATH = os.getenv("COMMIT_CACHE_PATH", ".cache/commit_patches.sqlite")
+COMMIT_CACHE_MAX_BYTES = int(os.getenv("COMMIT_CACHE_MAX_MB", "512")) * 1024 * 1024
+# Лимиты размера диффа: большие рефакторинги и сгенерированные файлы не должны занимать всю память
+MAX_PR_DIFF_KB = 2048
+MAX_FILE_DIFF_KB = 256
+# Файлы больше этого размера (КБ) не загружаются целиком для статического анализа
+MAX_SOURCE_FILE_KB = 1024
+# Сгенерированные и сторонние файлы, которые не нужно анализировать
+SKIP_GLOBS = [
+    '*.min.js', '*.min.css', '*.map',
+    '*.lock', '*package-lock.json', '*go.sum',
+    'vendor/*', '*/vendor/*', 'node_modules/*', '*/node_modules/*',
+    'dist/*', '*/dist/*', 'build/*', '*/build/*',
+    '*_pb2.py', '*_pb2_grpc.py', '*.pb.go', '*.generated.*', '*.g.dart',
+]
+
+_commit_cache = None
+_commit_cache_lock = threading.Lock()
+
 def parse_github_url(url: str) -> tuple[str, str]:
     """
     Извлекает владельца и название репозитория из URL GitHub.
@@ -28,23 +69,546 @@ def parse_github_url(url: str) -> tuple[str, str]:
         raise ValueError("Некорректный URL репозитория GitHub")
     return match.groups()
 
-def save_diff_to_file(diff_content: str, pr_number: int, output_dir: str) -> str:
+def is_skipped_file(filename: str, skip_globs: List[str]) -> bool:
     """
-    Сохраняет дифф в файл и возвращает путь к файлу.
-    
+    Проверяет, относится ли файл к сгенерированным или сторонним (vendored) файлам.
+
+    Args:
+        filename (str): Путь к файлу в репозитории.
+        skip_globs (List[str]): Шаблоны путей для пропуска.
+
+    Returns:
+        bool: True, если файл нужно пропустить.
+    """
+    return any(fnmatch(filename, pattern) for pattern in skip_globs)
+
+def save_diff_to_file(
+    files: Iterable[Dict],
+    pr_number: int,
+    output_dir: str,
+    max_pr_bytes: int = MAX_PR_DIFF_KB * 1024,
+    max_file_bytes: int = MAX_FILE_DIFF_KB * 1024,
+    skip_globs: Optional[List[str]] = None
+) -> Dict:
+    """
+    Потоково записывает патчи файлов в дифф PR, не собирая его целиком в памяти.
+    Пропускает файлы по шаблонам и слишком большие патчи, запись
+    прекращается при достижении лимита размера диффа PR.
+
     Args:
-        diff_content (str): Содержимое диффа.
+        files (Iterable[Dict]): Файлы коммитов (словари с ключами filename и patch).
         pr_number (int): Номер PR.
         output_dir (str): Путь к директории для сохранения файлов.
+        max_pr_bytes (int): Максимальный размер диффа PR в байтах.
+        max_file_bytes (int): Максимальный размер патча одного файла в байтах.
+        skip_globs (Optional[List[str]]): Шаблоны путей для пропуска (по умолчанию SKIP_GLOBS).
 
     Returns:
-        str: Путь к сохраненному файлу.
+        Dict: Путь к файлу (None, если ничего не записано), размер в байтах,
+            количество пропущенных файлов, признак обрезки по лимиту и записанные файлы (files).
     """
+    skip_globs = SKIP_GLOBS if skip_globs is None else skip_globs
     Path(output_dir).mkdir(parents=True, exist_ok=True)
     file_path = os.path.join(output_dir, f"pr_{pr_number}_diff.diff")
+    written = 0
+    skipped_files = 0
+    truncated = False
+    written_files = []
+
     with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(diff_content)
-    return file_path
+        for file in files:
+            patch = file['patch'] or ""
+            if is_skipped_file(file['filename'], skip_globs) or len(patch.encode('utf-8')) > max_file_bytes:
+                skipped_files += 1
+                continue
+
+            chunk = f"diff --git a/{file['filename']} b/{file['filename']}\n"
+            if patch:
+                chunk += patch + "\n\n"
+            size = len(chunk.encode('utf-8'))
+            if written + size > max_pr_bytes:
+                truncated = True
+                break
+            f.write(chunk)
+            written += size
+            if file['filename'] not in written_files:
+                written_files.append(file['filename'])
+
+    if not written:
+        os.remove(file_path)
+        file_path = None
+    return {
+        'path': file_path, 'bytes': written, 'skipped_files': skipped_files,
+        'truncated': truncated, 'files': written_files
+    }
+
+def format_search_date(date: datetime) -> str:
+    """
+    Форматирует дату для квалификатора поиска GitHub (merged:START..END).
+
+    Args:
+        date (datetime): Дата.
+
+    Returns:
+        str: Дата в формате ISO 8601 в UTC.
+    """
+    return date.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def parse_github_date(value: Optional[str]) -> Optional[datetime]:
+    """
+    Разбирает дату из ответа GitHub API.
+
+    Args:
+        value (Optional[str]): Дата в формате ISO 8601 (например, 2024-01-01T12:00:00Z).
+
+    Returns:
+        Optional[datetime]: Дата с часовым поясом или None.
+    """
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def as_utc(date: datetime) -> datetime:
+    """
+    Дата с часовым поясом: даты без пояса считаются датами в UTC
+    (даты GitHub всегда с поясом, а сравнивать их с датами без пояса нельзя).
+
+    Args:
+        date (datetime): Дата.
+
+    Returns:
+        datetime: Дата с часовым поясом.
+    """
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+def discover_merged_prs(
+    client: GithubClient,
+    repo_full_name: str,
+    start_date: datetime,
+    end_date: datetime,
+    stats: Dict,
+    method: str = "search"
+) -> Iterator:
+    """
+    Находит PR, смердженные в указанном диапазоне дат.
+    Стоимость поиска зависит от размера окна, а не от возраста репозитория.
+
+    Способы поиска:
+        "search" - поисковый API (is:pr is:merged merged:START..END),
+            при превышении лимита поиска автоматически используется "scan";
+        "scan" - обход закрытых PR по дате обновления с остановкой,
+            как только updated_at становится раньше start_date.
+
+    Args:
+        client (GithubClient): Клиент GitHub API.
+        repo_full_name (str): Полное имя репозитория (owner/name).
+        start_date (datetime): Начальная дата.
+        end_date (datetime): Конечная дата.
+        stats (Dict): Словарь для счетчиков (pages - загружено страниц, checked - просмотрено PR).
+        method (str): Способ поиска: "search" или "scan".
+
+    Returns:
+        Iterator: Итератор по PR (словари в формате GitHub API). PR из поиска содержат только
+            number, title, user, merged_at и updated_at: детали (merge_commit_sha, base)
+            загружаются при обработке PR (см. load_pr_details).
+    """
+    stats.setdefault('pages', 0)
+    stats.setdefault('checked', 0)
+
+    if method == "search":
+        query = (
+            f"repo:{repo_full_name} is:pr is:merged "
+            f"merged:{format_search_date(start_date)}..{format_search_date(end_date)}"
+        )
+        search_params = {'q': query, 'sort': 'updated', 'order': 'desc'}
+        # квота поиска - 30 запросов в минуту, поэтому total_count берется из первой страницы результатов,
+        # которая затем используется при обходе
+        first_page = client.request('/search/issues', {**search_params, 'per_page': client.per_page})
+        total = first_page[0]['total_count']
+
+        if total <= SEARCH_RESULTS_LIMIT:
+            logger.info(f"Поиск GitHub нашел {total} смердженных PR за период")
+            issues = client.paginate('/search/issues', search_params, item_key='items', stats=stats,
+                                     first_page=first_page)
+            for issue in issues:
+                stats['checked'] += 1
+                # Поиск возвращает issue: PR сразу отправляется в обработку,
+                # а его детали запрашиваются в пуле (load_pr_details), а не последовательно здесь
+                yield {
+                    'number': issue['number'],
+                    'title': issue['title'],
+                    'user': issue['user'],
+                    'merged_at': issue['pull_request']['merged_at'],
+                    'updated_at': issue['updated_at'],
+                }
+            return
+
+        stats['pages'] += 1
+        logger.warning(
+            f"Поиск GitHub нашел {total} PR (лимит {SEARCH_RESULTS_LIMIT}), "
+            f"переключаемся на обход списка PR"
+        )
+
+    elif method != "scan":
+        raise ValueError(f"Неизвестный способ поиска PR: {method}")
+
+    # Сортировка по дате обновления: merged_at <= updated_at, поэтому
+    # после первого PR, обновленного раньше start_date, подходящих PR больше нет
+    pulls = client.paginate(
+        f"/repos/{repo_full_name}/pulls",
+        {'state': 'closed', 'sort': 'updated', 'direction': 'desc'},
+        stats=stats
+    )
+    for pr in pulls:
+        stats['checked'] += 1
+
+        if parse_github_date(pr['updated_at']) < start_date:
+            logger.info(f"PR #{pr['number']} обновлен раньше {start_date.isoformat()}, обход остановлен")
+            break
+        yield pr
+
+def get_commit_cache() -> SqliteCache:
+    """
+    Возвращает общий для процесса кэш патчей коммитов, создавая его при первом обращении.
+
+    Returns:
+        SqliteCache: Кэш патчей коммитов.
+    """
+    global _commit_cache
+    with _commit_cache_lock:
+        if _commit_cache is None:
+            _commit_cache = SqliteCache(COMMIT_CACHE_PATH, COMMIT_CACHE_MAX_BYTES)
+        return _commit_cache
+
+def get_commit_files(
+    client: GithubClient,
+    repo_full_name: str,
+    sha: str,
+    cache: Optional[SqliteCache] = None
+) -> List[Dict]:
+    """
+    Получает список измененных файлов коммита с патчами.
+    Сначала проверяется кэш, запрос к API выполняется только при промахе.
+
+    Args:
+        client (GithubClient): Клиент GitHub API.
+        repo_full_name (str): Полное имя репозитория (owner/name).
+        sha (str): SHA коммита.
+        cache (Optional[SqliteCache]): Кэш патчей коммитов.
+
+    Returns:
+        List[Dict]: Список словарей с ключами filename и patch.
+    """
+    if cache is not None:
+        cached = cache.get(sha)
+        if cached is not None:
+            return json.loads(cached)
+
+    # Коммит неизменен и кэшируется по SHA, поэтому условный запрос не нужен
+    commit_details, _ = client.request(f"/repos/{repo_full_name}/commits/{sha}", conditional=False)
+    files = [{'filename': file['filename'], 'patch': file.get('patch')} for file in commit_details['files']]
+
+    if cache is not None:
+        cache.set(sha, json.dumps(files))
+    return files
+
+def get_file_content(
+    client: GithubClient,
+    repo_full_name: str,
+    sha: str,
+    path: str,
+    cache: Optional[SqliteCache] = None,
+    mirror_path: Optional[str] = None,
+    max_bytes: int = MAX_SOURCE_FILE_KB * 1024
+) -> Optional[str]:
+    """
+    Получает содержимое файла в указанном коммите (из зеркала или через contents API).
+    Содержимое неизменно для SHA, поэтому кэшируется вместе с патчами коммитов.
+
+    Args:
+        client (GithubClient): Клиент GitHub API.
+        repo_full_name (str): Полное имя репозитория (owner/name).
+        sha (str): SHA коммита.
+        path (str): Путь к файлу в репозитории.
+        cache (Optional[SqliteCache]): Кэш патчей коммитов.
+        mirror_path (Optional[str]): Путь к локальному зеркалу.
+        max_bytes (int): Файлы больше этого размера не загружаются.
+
+    Returns:
+        Optional[str]: Содержимое или None, если файла нет в коммите или он слишком большой.
+    """
+    if mirror_path:
+        content = get_local_file_content(mirror_path, sha, path)
+        return content if content is not None and len(content.encode('utf-8')) <= max_bytes else None
+
+    cache_key = f"content:{repo_full_name}:{sha}:{path}"
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        data, _ = client.request(
+            f"/repos/{repo_full_name}/contents/{quote(path, safe='/')}", {'ref': sha}, conditional=False
+        )
+    except GithubApiError as e:
+        if e.status == 404:
+            return None
+        raise
+    # для файлов больше 1 МБ API не возвращает содержимое (encoding: none)
+    if not isinstance(data, dict) or data.get('encoding') != 'base64' or data.get('size', 0) > max_bytes:
+        return None
+    content = base64.b64decode(data['content']).decode('utf-8', errors='replace')
+
+    if cache is not None:
+        cache.set(cache_key, content)
+    return content
+
+def save_source_files(
+    client: GithubClient,
+    repo_full_name: str,
+    pr: Dict,
+    filenames: List[str],
+    output_dir: str,
+    commit_pool: ThreadPoolExecutor,
+    cache: Optional[SqliteCache] = None,
+    mirror_path: Optional[str] = None
+) -> str:
+    """
+    Сохраняет содержимое файлов после мерджа PR (в merge_commit_sha) для статического анализа:
+    анализаторы проверяют настоящий файл, а не фрагменты ханков.
+    Файлы, содержимое которых получить не удалось, не сохраняются.
+
+    Args:
+        client (GithubClient): Клиент GitHub API.
+        repo_full_name (str): Полное имя репозитория (owner/name).
+        pr (Dict): PR в формате GitHub API.
+        filenames (List[str]): Пути файлов в репозитории.
+        output_dir (str): Путь к директории диффов автора.
+        commit_pool (ThreadPoolExecutor): Пул для загрузки файлов.
+        cache (Optional[SqliteCache]): Кэш патчей коммитов.
+        mirror_path (Optional[str]): Путь к локальному зеркалу.
+
+    Returns:
+        str: Папка с файлами PR (пути внутри нее совпадают с путями в репозитории).
+    """
+    source_dir = os.path.join(output_dir, f"pr_{pr['number']}_sources")
+    # пути вне репозитория (абсолютные или с "..") не записываются
+    filenames = [name for name in filenames if not Path(name).is_absolute() and '..' not in Path(name).parts]
+    futures = {
+        name: commit_pool.submit(
+            get_file_content, client, repo_full_name, pr['merge_commit_sha'], name, cache, mirror_path
+        )
+        for name in filenames
+    }
+    for name, future in futures.items():
+        try:
+            content = future.result()
+        except GithubApiError as e:
+            logger.warning(f"PR #{pr['number']}: не удалось получить файл {name}: {str(e)}")
+            continue
+        if content is None:
+            continue
+        path = Path(source_dir) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding='utf-8')
+    return source_dir
+
+def author_dir_name(email: str) -> str:
+    """
+    Имя папки для диффов автора (email без символов, недопустимых в путях).
+
+    Args:
+        email (str): Email автора.
+
+    Returns:
+        str: Имя папки.
+    """
+    return re.sub(r'[^\w.@+-]', '_', email)
+
+def load_pr_details(client: GithubClient, repo_full_name: str, pr: Dict) -> Dict:
+    """
+    Догружает детали PR, найденного поиском (merge_commit_sha, base);
+    PR из обхода списка уже содержит их и возвращается как есть.
+
+    Args:
+        client (GithubClient): Клиент GitHub API.
+        repo_full_name (str): Полное имя репозитория (owner/name).
+        pr (Dict): PR из discover_merged_prs.
+
+    Returns:
+        Dict: PR в формате GitHub API.
+    """
+    if 'merge_commit_sha' in pr and 'base' in pr:
+        return pr
+    # обычно 304 по ETag
+    details, _ = client.request(f"/repos/{repo_full_name}/pulls/{pr['number']}")
+    return details
+
+@timed("commit_fetch")
+def process_pr(
+    client: GithubClient,
+    repo_full_name: str,
+    pr: Dict,
+    emails: Optional[List[str]],
+    output_dir: str,
+    commit_pool: ThreadPoolExecutor,
+    cache: Optional[SqliteCache] = None,
+    mirror_path: Optional[str] = None,
+    diff_limits: Optional[Dict] = None,
+    source_suffixes: Optional[List[str]] = None
+) -> Dict[str, Dict]:
+    """
+    Собирает диффы коммитов авторов в одном PR и сохраняет их в файлы (по файлу на автора).
+    Список коммитов PR запрашивается один раз и делится по email авторов,
+    файлы коммитов запрашиваются параллельно в пуле commit_pool.
+
+    Args:
+        client (GithubClient): Клиент GitHub API.
+        repo_full_name (str): Полное имя репозитория (owner/name).
+        pr (Dict): PR в формате GitHub API.
+        emails (Optional[List[str]]): Email авторов (None - все авторы коммитов PR).
+        output_dir (str): Путь к директории для сохранения файлов (диффы автора - в подпапке author_dir_name).
+        commit_pool (ThreadPoolExecutor): Пул для загрузки файлов коммитов.
+        cache (Optional[SqliteCache]): Кэш патчей коммитов.
+        mirror_path (Optional[str]): Путь к локальному зеркалу; если задан, коммиты и патчи берутся из него.
+        diff_limits (Optional[Dict]): Лимиты записи диффа (аргументы save_diff_to_file).
+        source_suffixes (Optional[List[str]]): Расширения файлов, содержимое которых после мерджа
+            сохраняется для статического анализа (None - не сохранять).
+
+    Returns:
+        Dict[str, Dict]: Email автора -> информация о PR и путь к файлу с изменениями автора
+            (авторы без изменений для анализа не включаются).
+    """
+    try:
+        pr = load_pr_details(client, repo_full_name, pr)
+        if mirror_path:
+            # Коммиты из локального зеркала (git log по refs/pull/<номер>/head до даты мерджа)
+            commits = list_pr_commits(
+                mirror_path, pr['number'], pr['base']['sha'], emails, parse_github_date(pr['merged_at'])
+            )
+        else:
+            # Получаем ВСЕ коммиты PR один раз для всех авторов
+            all_commits = client.paginate(f"/repos/{repo_full_name}/pulls/{pr['number']}/commits")
+            # автор в отчете - логин GitHub автора коммита, а без привязки к аккаунту - имя из коммита
+            commits = [
+                (
+                    commit['sha'], commit['commit']['author']['email'],
+                    (commit.get('author') or {}).get('login') or commit['commit']['author']['name']
+                )
+                for commit in all_commits if commit['commit']['author']
+            ]
+    except (GithubApiError, GitCommandError) as e:
+        logger.warning(f"Не удалось обработать PR #{pr['number']}: {str(e)}")
+        return {}
+
+    # Делим коммиты по авторам, сохраняя порядок коммитов
+    wanted = set(emails) if emails is not None else None
+    author_commits = {}
+    author_names = {}
+    for sha, author_email, author_name in commits:
+        if wanted is None or author_email in wanted:
+            author_commits.setdefault(author_email, []).append(sha)
+            # имя берется из последнего коммита автора
+            author_names[author_email] = author_name
+
+    results = {}
+    for email, author_shas in author_commits.items():
+        result = save_author_diff(
+            client, repo_full_name, pr, email, author_shas, author_names[email],
+            os.path.join(output_dir, author_dir_name(email)), commit_pool, cache, mirror_path, diff_limits,
+            source_suffixes
+        )
+        if result:
+            results[email] = result
+    return results
+
+def save_author_diff(
+    client: GithubClient,
+    repo_full_name: str,
+    pr: Dict,
+    email: str,
+    author_shas: List[str],
+    author_name: str,
+    output_dir: str,
+    commit_pool: ThreadPoolExecutor,
+    cache: Optional[SqliteCache] = None,
+    mirror_path: Optional[str] = None,
+    diff_limits: Optional[Dict] = None,
+    source_suffixes: Optional[List[str]] = None
+) -> Optional[Dict]:
+    """
+    Собирает дифф коммитов одного автора в PR и сохраняет его в файл.
+
+    Args:
+        client (GithubClient): Клиент GitHub API.
+        repo_full_name (str): Полное имя репозитория (owner/name).
+        pr (Dict): PR в формате GitHub API.
+        email (str): Email автора.
+        author_shas (List[str]): SHA коммитов автора (от старых к новым).
+        author_name (str): Логин GitHub автора коммитов (или имя из коммита, если логина нет).
+        output_dir (str): Путь к директории для сохранения файлов.
+        commit_pool (ThreadPoolExecutor): Пул для загрузки файлов коммитов.
+        cache (Optional[SqliteCache]): Кэш патчей коммитов.
+        mirror_path (Optional[str]): Путь к локальному зеркалу.
+        diff_limits (Optional[Dict]): Лимиты записи диффа (аргументы save_diff_to_file).
+        source_suffixes (Optional[List[str]]): Расширения файлов, содержимое которых после мерджа
+            сохраняется для статического анализа (None - не сохранять).
+
+    Returns:
+        Optional[Dict]: Информация о PR и путь к файлу с изменениями или None, если изменений автора нет.
+    """
+    try:
+        # Получаем файлы для каждого коммита (из зеркала, кэша или через API) параллельно
+        if mirror_path:
+            commit_futures = [commit_pool.submit(get_local_commit_files, mirror_path, sha) for sha in author_shas]
+        else:
+            commit_futures = [commit_pool.submit(get_commit_files, client, repo_full_name, sha, cache) for sha in author_shas]
+
+        # Записываем diff ТОЛЬКО из коммитов автора по мере загрузки, сохраняя порядок коммитов
+        files = (file for future in commit_futures for file in future.result())
+        saved = save_diff_to_file(files, pr['number'], output_dir, **(diff_limits or {}))
+
+        # Если дифф обрезан по лимиту, оставшиеся коммиты больше не нужны
+        for future in commit_futures:
+            future.cancel()
+
+        if saved['skipped_files']:
+            logger.info(f"PR #{pr['number']}: пропущено {saved['skipped_files']} сгенерированных или больших файлов")
+        if saved['truncated']:
+            logger.warning(f"PR #{pr['number']}: дифф обрезан по лимиту размера ({saved['bytes']} байт)")
+
+        if not saved['path']:
+            logger.warning(f"PR #{pr['number']} не содержит изменений автора {email} для анализа")
+            return None
+        diff_path = saved['path']
+
+        source_dir = None
+        if source_suffixes:
+            source_dir = save_source_files(
+                client, repo_full_name, pr,
+                [name for name in saved['files'] if Path(name).suffix.lower() in source_suffixes],
+                output_dir, commit_pool, cache, mirror_path
+            )
+
+        logger.info(f"Найден подходящий PR #{pr['number']} с {len(author_shas)} коммитами автора")
+        return {
+            'pr_number': pr['number'],
+            'title': pr['title'],
+            'merged_at': parse_github_date(pr['merged_at']).isoformat(),
+            'author': author_name,
+            'diff_path': diff_path,
+            'source_dir': source_dir,
+            'commit_sha': pr['merge_commit_sha'],
+            'author_commits_count': len(author_shas),  # Добавим количество релевантных коммитов
+            'author_commit_shas': author_shas,
+            'skipped_files': saved['skipped_files'],
+            'truncated': saved['truncated']
+        }
+
+    except (GithubApiError, GitCommandError) as e:
+        logger.warning(f"Не удалось обработать PR #{pr['number']} автора {email}: {str(e)}")
+        return None
 
 def get_diffs(
     github_url: str,
@@ -52,7 +616,8 @@ def get_diffs(
     start_date: datetime,
     end_date: datetime,
     access_token: Optional[str] = None,
-    output_dir: str = "diffs"
+    output_dir: str = "diffs",
+    **options
 ) -> List[Dict]:
     """
     Получает диффы для merge requests, проверяя email в коммитах.
@@ -65,91 +630,155 @@ def get_diffs(
         end_date (datetime): Конечная дата.
         access_token (Optional[str]): Токен доступа к GitHub API.
         output_dir (str): Путь к директории для сохранения файлов.
+        **options: Остальные параметры get_diffs_by_author.
 
     Returns:
         List[Dict]: Список словарей, содержащих информацию о PR и пути к файлам с изменениями.
     """
+    return get_diffs_by_author(
+        github_url, [email], start_date, end_date, access_token, output_dir, **options
+    )[email]
+
+def get_diffs_by_author(
+    github_url: str,
+    emails: Optional[List[str]],
+    start_date: datetime,
+    end_date: datetime,
+    access_token: Optional[str] = None,
+    output_dir: str = "diffs",
+    discovery: str = "search",
+    max_workers: int = MAX_WORKERS,
+    use_cache: bool = True,
+    backend: str = "api",
+    scheduler: Optional[RateLimitScheduler] = None,
+    max_pr_diff_kb: int = MAX_PR_DIFF_KB,
+    max_file_diff_kb: int = MAX_FILE_DIFF_KB,
+    skip_globs: Optional[List[str]] = None,
+    source_suffixes: Optional[List[str]] = None
+) -> Dict[str, List[Dict]]:
+    """
+    Получает диффы для merge requests сразу для нескольких авторов.
+    Поиск PR и списки коммитов PR запрашиваются один раз для всех авторов,
+    коммиты делятся по email, изменения каждого автора сохраняются в отдельный дифф.
+
+    Args:
+        github_url (str): URL GitHub репозитория.
+        emails (Optional[List[str]]): Email авторов (None - все авторы коммитов смердженных PR).
+        start_date (datetime): Начальная дата.
+        end_date (datetime): Конечная дата.
+        access_token (Optional[str]): Токен доступа к GitHub API.
+        output_dir (str): Путь к директории для сохранения файлов.
+        discovery (str): Способ поиска PR: "search" (поисковый API) или "scan" (обход списка).
+        max_workers (int): Количество одновременных запросов к GitHub API.
+        use_cache (bool): Использовать персистентный кэш патчей коммитов.
+        backend (str): Источник коммитов и патчей: "api" (REST API GitHub) или
+            "local" (локальное bare-зеркало репозитория, обновляемое через git fetch).
+        scheduler (Optional[RateLimitScheduler]): Общий планировщик запросов с учетом квоты GitHub.
+        max_pr_diff_kb (int): Максимальный размер диффа одного PR в КБ.
+        max_file_diff_kb (int): Файлы с патчем больше этого размера (КБ) пропускаются.
+        skip_globs (Optional[List[str]]): Шаблоны путей сгенерированных и сторонних файлов
+            для пропуска (по умолчанию SKIP_GLOBS).
+        source_suffixes (Optional[List[str]]): Расширения файлов, содержимое которых после мерджа
+            (в merge_commit_sha) сохраняется для статического анализа (None - не сохранять).
+
+    Returns:
+        Dict[str, List[Dict]]: Email автора -> список словарей, содержащих информацию о PR
+            и пути к файлам с изменениями автора.
+    """
+    start_date, end_date = as_utc(start_date), as_utc(end_date)
     try:
         # Инициализация клиента GitHub
-        g = Github(access_token) if access_token else Github()
+        client = GithubClient(
+            access_token,
+            scheduler=scheduler or RateLimitScheduler(min_interval=SECONDS_BETWEEN_REQUESTS),
+            etag_cache=get_etag_cache() if use_cache else None,
+            per_page=PER_PAGE,
+            pool_size=max_workers * 2
+        )
         
         # Проверка валидности токена
         if access_token:
             try:
-                g.get_user().login
-            except GithubException as e:
+                client.request('/user')
+            except GithubApiError as e:
                 logger.error("Недействительный токен доступа")
                 raise ValueError("Недействительный токен доступа")
 
         owner, repo_name = parse_github_url(github_url)
-        repo = g.get_repo(f"{owner}/{repo_name}")
+        repo, _ = client.request(f"/repos/{owner}/{repo_name}")
+        repo_full_name = repo['full_name']
         
-        result = []
+        mirror_path = None
+        if backend == "local":
+            mirror_path = sync_mirror(owner, repo_name, access_token)
+            logger.info(f"Локальное зеркало репозитория обновлено: {mirror_path}")
+        elif backend != "api":
+            raise ValueError(f"Неизвестный источник диффов: {backend}")
+
+        result = {email: [] for email in emails or []}
         processed_prs = 0
         found_prs = 0
-        
-        # Получаем все закрытые PR
-        pulls = repo.get_pulls(state='closed', sort='updated', direction='desc')
-        
-        for pr in pulls:
-            processed_prs += 1
-            logger.info(f"Проверяем PR #{pr.number} (обработано {processed_prs} PR)")
-            
-            # Пропускаем, если PR не был мерджен или вне диапазона дат
-            if not pr.merged_at:
-                continue
-            if not (start_date <= pr.merged_at <= end_date):
-                continue
+        discovery_stats = {}
+        cache = get_commit_cache() if use_cache and not mirror_path else None
+        diff_limits = {
+            'max_pr_bytes': max_pr_diff_kb * 1024,
+            'max_file_bytes': max_file_diff_kb * 1024,
+            'skip_globs': skip_globs
+        }
 
-            # Получаем ВСЕ коммиты PR и фильтруем по email
-            try:
-                all_commits = list(pr.get_commits())
-                author_commits = [
-                    commit for commit in all_commits
-                    if commit.commit.author and commit.commit.author.email == email
-                ]
-                
-                # Пропускаем PR, если нет коммитов автора
-                if not author_commits:
-                    continue
-
-                # Собираем diff ТОЛЬКО из коммитов автора
-                diff_content = ""
-                for commit in author_commits:
-                    # Получаем файлы для каждого коммита (через API)
-                    commit_details = repo.get_commit(commit.sha)
-                    for file in commit_details.files:
-                        diff_content += f"diff --git a/{file.filename} b/{file.filename}\n"
-                        if file.patch:
-                            diff_content += file.patch + "\n\n"
-                
-                if not diff_content:
-                    logger.warning(f"PR #{pr.number} не содержит изменений автора {email}")
-                    continue
-                
-                # Сохраняем diff в файл
-                diff_path = save_diff_to_file(diff_content, pr.number, output_dir)
-                
-                result.append({
-                    'pr_number': pr.number,
-                    'title': pr.title,
-                    'merged_at': pr.merged_at.isoformat(),
-                    'author': pr.user.login,
-                    'diff_path': diff_path,
-                    'commit_sha': pr.merge_commit_sha,
-                    'author_commits_count': len(author_commits)  # Добавим количество релевантных коммитов
-                })
-                found_prs += 1
-                logger.info(f"Найден подходящий PR #{pr.number} с {len(author_commits)} коммитами автора")
-            
-            except GithubException as e:
-                logger.warning(f"Не удалось обработать PR #{pr.number}: {str(e)}")
-                continue
-        
-        logger.info(f"Обработано {processed_prs} PR, найдено {found_prs} подходящих PR")
+        # Пул для PR (список коммитов) и отдельный пул для файлов коммитов:
+        # задачи PR ждут задачи коммитов, поэтому один общий пул мог бы заблокироваться
+        with ThreadPoolExecutor(max_workers=max_workers) as pr_pool, \
+                ThreadPoolExecutor(max_workers=max_workers) as commit_pool:
+            # Получаем только PR, смердженные в указанном диапазоне;
+            # PR отправляются в обработку по мере поиска
+            pulls = discover_merged_prs(client, repo_full_name, start_date, end_date, discovery_stats, method=discovery)
+            futures = []
+            with timed("pr_discovery"):
+                for pr in pulls:
+                    processed_prs += 1
+                    logger.info(f"Проверяем PR #{pr['number']} (обработано {processed_prs} PR)")
+
+                    # Пропускаем, если PR не был мерджен или вне диапазона дат
+                    merged_at = parse_github_date(pr['merged_at'])
+                    if not merged_at:
+                        continue
+                    if not (start_date <= merged_at <= end_date):
+                        continue
+
+                    futures.append(pr_pool.submit(
+                        propagate(process_pr), client, repo_full_name, pr, emails, output_dir,
+                        commit_pool, cache, mirror_path, diff_limits, source_suffixes
+                    ))
+
+            # Собираем результаты в порядке поиска PR
+            for future in futures:
+                pr_results = future.result()
+                if pr_results:
+                    found_prs += 1
+                for email, pr_result in pr_results.items():
+                    result.setdefault(email, []).append(pr_result)
+
+        logger.info(
+            f"Обработано {processed_prs} PR, найдено {found_prs} подходящих PR "
+            f"с изменениями {sum(1 for prs in result.values() if prs)} авторов"
+        )
+        logger.info(
+            f"Поиск PR: загружено страниц {discovery_stats['pages']}, "
+            f"просмотрено PR {discovery_stats['checked']}, подходящих PR {found_prs}"
+        )
+        logger.info(
+            f"Запросов к GitHub API: {client.stats['requests']}, "
+            f"из них без изменений (304, без расхода квоты): {client.stats['not_modified']}"
+        )
+        if cache is not None:
+            logger.info(f"Кэш патчей коммитов: {cache.stats()}")
+        count("github_requests", client.stats['requests'])
+        count("github_not_modified", client.stats['not_modified'])
+        count("prs", found_prs)
         return result
     
-    except GithubException as e:
+    except GithubApiError as e:
         if e.status == 403:
             logger.error("Нет доступа к репозиторию. Проверьте токен.")
         elif e.status == 404:
@@ -159,4 +788,85 @@ def get_diffs(
         raise
     except Exception as e:
         logger.error(f"Неожиданная ошибка: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def get_merged_prs_fingerprint(
+    github_url: str,
+    start_date: datetime,
+    end_date: datetime,
+    access_token: Optional[str] = None,
+    discovery: str = "search",
+    scheduler: Optional[RateLimitScheduler] = None
+) -> str:
+    """
+    Отпечаток набора PR, смердженных в указанном диапазоне дат: хэш номеров PR и SHA merge-коммитов.
+    Отпечаток меняется, только когда в окне появляются новые PR, поэтому по нему можно
+    проверять актуальность готового отчета. Запросы идут через кэш ETag, поэтому повторная
+    проверка обычно не расходует квоту GitHub API.
+
+    Args:
+        github_url (str): URL GitHub репозитория.
+        start_date (datetime): Начальная дата.
+        end_date (datetime): Конечная дата.
+        access_token (Optional[str]): Токен доступа к GitHub API.
+        discovery (str): Способ поиска PR: "search" или "scan".
+        scheduler (Optional[RateLimitScheduler]): Общий планировщик запросов с учетом квоты GitHub.
+
+    Returns:
+        str: Отпечаток (sha256 в hex).
+    """
+    start_date, end_date = as_utc(start_date), as_utc(end_date)
+    client = GithubClient(
+        access_token,
+        scheduler=scheduler or RateLimitScheduler(min_interval=SECONDS_BETWEEN_REQUESTS),
+        etag_cache=get_etag_cache(),
+        per_page=PER_PAGE
+    )
+    owner, repo_name = parse_github_url(github_url)
+    repo, _ = client.request(f"/repos/{owner}/{repo_name}")
+
+    merged = []
+    for pr in discover_merged_prs(client, repo['full_name'], start_date, end_date, {}, method=discovery):
+        merged_at = parse_github_date(pr['merged_at'])
+        if merged_at and start_date <= merged_at <= end_date:
+            # PR смерживается один раз, поэтому номера и даты мерджа достаточно
+            merged.append(f"{pr['number']}:{pr['merged_at']}")
+
+    return hashlib.sha256("\n".join(sorted(merged)).encode()).hexdigest()
+
+def list_owner_repos(
+    owner: str,
+    access_token: Optional[str] = None,
+    include_forks: bool = False,
+    scheduler: Optional[RateLimitScheduler] = None
+) -> List[str]:
+    """
+    Список репозиториев организации или пользователя GitHub.
+
+    Args:
+        owner (str): Имя организации или пользователя (или ссылка https://github.com/owner).
+        access_token (Optional[str]): Токен доступа к GitHub API (нужен для приватных репозиториев).
+        include_forks (bool): Включать форки.
+        scheduler (Optional[RateLimitScheduler]): Общий планировщик запросов с учетом квоты GitHub.
+
+    Returns:
+        List[str]: Ссылки на репозитории.
+    """
+    owner = owner.rstrip('/').split('/')[-1]
+    client = GithubClient(
+        access_token,
+        scheduler=scheduler or RateLimitScheduler(min_interval=SECONDS_BETWEEN_REQUESTS),
+        etag_cache=get_etag_cache(),
+        per_page=PER_PAGE
+    )
+    try:
+        repos = list(client.paginate(f"/orgs/{owner}/repos", {'type': 'all'}))
+    except GithubApiError as e:
+        if e.status != 404:
+            raise
+        # не организация - репозитории пользователя
+        repos = list(client.paginate(f"/users/{owner}/repos", {'type': 'owner'}))
+
+    urls = [repo['html_url'] for repo in repos if include_forks or not repo['fork']]
+    logger.info(f"Репозиториев {owner}: {len(urls)} (всего {len(repos)}, форки {'включены' if include_forks else 'пропущены'})")
+    return urls
@@ -1,29 +1,47 @@
+import os
+import threading
+import uuid
 from datetime import datetime
-from typing import List, Dict, Optional
-from docx import Document
-from docx2pdf import convert
+from pathlib import Path
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
 
 from utils.file_work import *
 from utils.json_docx_work import *
 from utils.diff_work import *
+from utils.history_work import ReviewHistory
+from utils.record_work import get_pr_records, pr_record_key, load_pr_record, save_pr_record
 from analyze.mistral_analyze import *
+from analyze.verdict_schema import OverallReview, parse_review, review_schema
 from analyze.static_analysis import *
 from download_repo import *
+from github_client import GITHUB_MAX_CONCURRENT
+from utils.metrics_work import timed, propagate
+from report_model import (
+    Report, PullRequestReport, FileReport, StaticFindings, AuthorSummary, TeamSummary, SkippedRepository,
+    REPORT_FORMATS, render_report, render_team_summary
+)
 
 WEIGHTS = {
     "CodeSmells": 4.0,
     "AntiPatterns": 5.0,
     "LegacyCompatibility": 1.0
 }
+# Количество репозиториев, которые загружаются и анализируются одновременно в отчете по нескольким репозиториям
+REPO_WORKERS = int(os.getenv("REPO_WORKERS", "4"))
 
 def form_report(github_url: str,
     email: str,
     start_date: datetime,
     end_date: datetime,
-    access_token: Optional[str] = None) -> str:
+    access_token: Optional[str] = None,
+    llm_parallel: int = OLLAMA_NUM_PARALLEL,
+    static_workers: int = STATIC_ANALYSIS_WORKERS,
+    progress: Optional[Callable[[str, float], None]] = None,
+    report_format: str = "pdf") -> str:
 
     """
-    Формирование pdf-отчета о качестве кода и наличию в нем различных проблем и нарушений
+    Формирование отчета о качестве кода и наличию в нем различных проблем и нарушений
 
     Args:
         github_url (str): ссылка на репозиторий
@@ -31,23 +49,341 @@ def form_report(github_url: str,
         start_date (datetime): дата начала анализа
         end_date (datetime): дата конца анализа
         access_token (str): токен гитхаба для доступа к репозиторию
+        llm_parallel (int): количество одновременных запросов к модели
+        static_workers (int): количество процессов статического анализа
+        progress (Optional[Callable[[str, float], None]]): функция, которой передаются
+            текущий этап и доля выполненной работы (от 0 до 1)
+        report_format (str): формат отчета: pdf, json, html или docx
 
     Returns:
-        str: путь к созданному pdf-отчету
+        str: путь к созданному отчету
     """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат отчета: {report_format}")
+    if progress is None:
+        progress = lambda stage, fraction: None
 
-    time = datetime.now().strftime("%Y-%m-%d_%H-%M")
+    # уникальный суффикс, чтобы одновременные отчеты не использовали одни и те же файлы
+    time = f'{datetime.now().strftime("%Y-%m-%d_%H-%M")}-{uuid.uuid4().hex[:8]}'
+
+    report = build_report(github_url, email, start_date, end_date, access_token,
+                          llm_parallel, static_workers, progress, time)
+
+    progress(f"формирование {report_format}", 0.95)
+    return render_report(report, report_format, f'report-{report.author}-{time}')
+
+def form_team_reports(github_url: str,
+    emails: Optional[List[str]],
+    start_date: datetime,
+    end_date: datetime,
+    access_token: Optional[str] = None,
+    llm_parallel: int = OLLAMA_NUM_PARALLEL,
+    static_workers: int = STATIC_ANALYSIS_WORKERS,
+    progress: Optional[Callable[[str, float], None]] = None,
+    report_format: str = "pdf") -> Tuple[str, Dict[str, str]]:
+
+    """
+    Формирование отчетов для нескольких авторов и сводки по команде.
+    PR и их коммиты загружаются один раз для всех авторов, а не отдельно для каждого
+
+    Args:
+        github_url (str): ссылка на репозиторий
+        emails (Optional[List[str]]): почты авторов (None - все авторы коммитов смердженных PR)
+        start_date (datetime): дата начала анализа
+        end_date (datetime): дата конца анализа
+        access_token (str): токен гитхаба для доступа к репозиторию
+        llm_parallel (int): количество одновременных запросов к модели
+        static_workers (int): количество процессов статического анализа
+        progress (Optional[Callable[[str, float], None]]): функция, которой передаются
+            текущий этап и доля выполненной работы (от 0 до 1)
+        report_format (str): формат отчетов: pdf, json, html или docx
+
+    Returns:
+        Tuple[str, Dict[str, str]]: путь к сводке по команде и пути к отчетам авторов по email
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат отчета: {report_format}")
+    if progress is None:
+        progress = lambda stage, fraction: None
+
+    # даты без часового пояса считаются датами в UTC, как и в get_diffs_by_author
+    start_date, end_date = as_utc(start_date), as_utc(end_date)
+    time = f'{datetime.now().strftime("%Y-%m-%d_%H-%M")}-{uuid.uuid4().hex[:8]}'
     diff_output_dir = f'diff-{time}'
 
-    diffs = get_diffs(
-        github_url=github_url,
-        email=email,
-        start_date=start_date,
-        end_date=end_date,
-        # токен гитхаба из переменных окружения
-        access_token=access_token,
-        output_dir=diff_output_dir
-    )
+    progress("загрузка PR", 0.0)
+    owner, repo_name = parse_github_url(github_url)
+
+    report_paths = {}
+    authors = []
+    # диффы удаляются и в том случае, если загрузка прервалась на середине
+    try:
+        diffs_by_author = get_diffs_by_author(
+            github_url=github_url,
+            emails=emails,
+            start_date=start_date,
+            end_date=end_date,
+            access_token=access_token,
+            output_dir=diff_output_dir,
+            # для статического анализа загружаются полные версии файлов после мерджа
+            source_suffixes=list(ANALYZERS)
+        )
+        for index, email in enumerate(sorted(diffs_by_author)):
+            # доля работы, приходящаяся на одного автора
+            start, share = 0.1 + 0.85 * index / len(diffs_by_author), 0.85 / len(diffs_by_author)
+            author_progress = lambda stage, fraction, email=email, start=start, share=share: progress(
+                f"{email}: {stage}", start + share * fraction
+            )
+            report = analyze_author_diffs(github_url, email, diffs_by_author[email], start_date, end_date,
+                                          llm_parallel, static_workers, author_progress)
+            report_paths[email] = render_report(report, report_format, f'report-{author_dir_name(email)}-{time}')
+            authors.append(AuthorSummary.from_report(report, report_paths[email]))
+    finally:
+        delete_dir(diff_output_dir)
+
+    progress(f"формирование {report_format}", 0.95)
+    summary = TeamSummary.from_authors(f"{owner}/{repo_name}", start_date, end_date, authors)
+    return render_team_summary(summary, report_format, f'team-{repo_name}-{time}'), report_paths
+
+def form_multi_repo_report(github_urls: List[str],
+    email: str,
+    start_date: datetime,
+    end_date: datetime,
+    access_token: Optional[str] = None,
+    orgs: Optional[List[str]] = None,
+    llm_parallel: int = OLLAMA_NUM_PARALLEL,
+    static_workers: int = STATIC_ANALYSIS_WORKERS,
+    progress: Optional[Callable[[str, float], None]] = None,
+    report_format: str = "pdf",
+    repo_workers: int = REPO_WORKERS) -> str:
+
+    """
+    Формирование одного отчета о качестве кода автора по нескольким репозиториям (см. build_multi_repo_report)
+
+    Args:
+        github_urls (List[str]): ссылки на репозитории
+        email (str): почта пользователя, для которого будет формироваться отчет
+        start_date (datetime): дата начала анализа
+        end_date (datetime): дата конца анализа
+        access_token (str): токен гитхаба для доступа к репозиториям
+        orgs (Optional[List[str]]): организации или пользователи GitHub, все репозитории которых
+            (кроме форков) добавляются к github_urls
+        llm_parallel (int): количество одновременных запросов к модели
+        static_workers (int): количество процессов статического анализа
+        progress (Optional[Callable[[str, float], None]]): функция, которой передаются
+            текущий этап и доля выполненной работы (от 0 до 1)
+        report_format (str): формат отчета: pdf, json, html или docx
+        repo_workers (int): количество одновременно обрабатываемых репозиториев
+
+    Returns:
+        str: путь к созданному отчету
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат отчета: {report_format}")
+    if progress is None:
+        progress = lambda stage, fraction: None
+
+    time = f'{datetime.now().strftime("%Y-%m-%d_%H-%M")}-{uuid.uuid4().hex[:8]}'
+    report = build_multi_repo_report(github_urls, email, start_date, end_date, access_token, orgs,
+                                     llm_parallel, static_workers, progress, repo_workers, time)
+
+    progress(f"формирование {report_format}", 0.95)
+    return render_report(report, report_format, f'report-{report.author}-{time}')
+
+def build_multi_repo_report(github_urls: List[str],
+    email: str,
+    start_date: datetime,
+    end_date: datetime,
+    access_token: Optional[str] = None,
+    orgs: Optional[List[str]] = None,
+    llm_parallel: int = OLLAMA_NUM_PARALLEL,
+    static_workers: int = STATIC_ANALYSIS_WORKERS,
+    progress: Optional[Callable[[str, float], None]] = None,
+    repo_workers: int = REPO_WORKERS,
+    run_id: Optional[str] = None) -> Report:
+
+    """
+    Данные одного отчета о качестве кода автора по нескольким репозиториям (без вывода в файл).
+    Репозитории загружаются одновременно через общий планировщик запросов к GitHub
+    (общая квота токена и общий лимит одновременных запросов), а запросы к модели
+    всех репозиториев идут через одну очередь из llm_parallel потоков
+
+    Args:
+        github_urls (List[str]): ссылки на репозитории
+        email (str): почта пользователя, для которого будет формироваться отчет
+        start_date (datetime): дата начала анализа
+        end_date (datetime): дата конца анализа
+        access_token (str): токен гитхаба для доступа к репозиториям
+        orgs (Optional[List[str]]): организации или пользователи GitHub, все репозитории которых
+            (кроме форков) добавляются к github_urls
+        llm_parallel (int): количество одновременных запросов к модели
+        static_workers (int): количество процессов статического анализа
+        progress (Optional[Callable[[str, float], None]]): функция, которой передаются
+            текущий этап и доля выполненной работы (от 0 до 1)
+        repo_workers (int): количество одновременно обрабатываемых репозиториев
+        run_id (Optional[str]): уникальный идентификатор запуска для имен временных папок
+
+    Returns:
+        Report: отчет
+    """
+    if progress is None:
+        progress = lambda stage, fraction: None
+
+    time = run_id or uuid.uuid4().hex
+    # один планировщик на все репозитории: квота токена общая
+    scheduler = RateLimitScheduler(min_interval=SECONDS_BETWEEN_REQUESTS, max_concurrent=GITHUB_MAX_CONCURRENT)
+
+    progress("поиск репозиториев", 0.0)
+    repositories = list(github_urls)
+    for org in orgs or []:
+        repositories += list_owner_repos(org, access_token, scheduler=scheduler)
+    # без повторов, в порядке указания
+    repositories = list(dict.fromkeys(url.rstrip('/') for url in repositories))
+    if not repositories:
+        raise ValueError("Не указан ни один репозиторий")
+    logger.info(f"Отчет по {len(repositories)} репозиториям")
+
+    finished = []
+    skipped = []
+    finished_lock = threading.Lock()
+
+    def analyze_repository(index: int, github_url: str) -> Optional[Report]:
+        diff_output_dir = f'diff-{time}-{index}'
+        try:
+            diffs = get_diffs(
+                github_url=github_url,
+                email=email,
+                start_date=start_date,
+                end_date=end_date,
+                access_token=access_token,
+                output_dir=diff_output_dir,
+                scheduler=scheduler,
+                source_suffixes=list(ANALYZERS)
+            )
+            # итоговый обзор формируется один раз по объединенному отчету
+            return analyze_author_diffs(github_url, email, diffs, start_date, end_date, llm_parallel,
+                                        static_workers, review=False, llm_pool=llm_pool, static_pool=static_pool)
+        except Exception as e:
+            # ошибка одного репозитория (нет доступа, удален) не отменяет отчет по остальным
+            logger.exception(f"Репозиторий {github_url} пропущен")
+            with finished_lock:
+                skipped.append(SkippedRepository(repository=github_url, error=str(e) or type(e).__name__))
+            return None
+        finally:
+            delete_dir(diff_output_dir)
+            with finished_lock:
+                finished.append(github_url)
+                progress(f"репозитории {len(finished)}/{len(repositories)}", 0.05 + 0.85 * len(finished) / len(repositories))
+
+    with ThreadPoolExecutor(max_workers=max(llm_parallel, 1), thread_name_prefix="llm") as llm_pool, \
+            ProcessPoolExecutor(max_workers=max(static_workers, 1)) as static_pool, \
+            ThreadPoolExecutor(max_workers=max(repo_workers, 1), thread_name_prefix="repo") as repo_pool:
+        reports = list(repo_pool.map(propagate(analyze_repository), range(len(repositories)), repositories))
+
+    reports = [report for report in reports if report is not None]
+    if not reports:
+        raise RuntimeError("Не удалось обработать ни один репозиторий: " +
+                           "; ".join(f"{item.repository}: {item.error}" for item in skipped))
+    # в порядке указания репозиториев
+    skipped.sort(key=lambda item: repositories.index(item.repository))
+    report = Report.merge(reports, skipped)
+    progress("итоговый обзор", 0.9)
+    history = review_history(report)
+    if history.is_empty():
+        logger.info("Нет данных для итогового обзора")
+    else:
+        report.review = make_review(history)
+    return report
+
+def build_report(github_url: str,
+    email: str,
+    start_date: datetime,
+    end_date: datetime,
+    access_token: Optional[str] = None,
+    llm_parallel: int = OLLAMA_NUM_PARALLEL,
+    static_workers: int = STATIC_ANALYSIS_WORKERS,
+    progress: Optional[Callable[[str, float], None]] = None,
+    run_id: Optional[str] = None) -> Report:
+
+    """
+    Анализ PR автора и формирование данных отчета (без вывода в файл)
+
+    Args:
+        github_url (str): ссылка на репозиторий
+        email (str): почта пользователя, для которого будет формироваться отчет
+        start_date (datetime): дата начала анализа
+        end_date (datetime): дата конца анализа
+        access_token (str): токен гитхаба для доступа к репозиторию
+        llm_parallel (int): количество одновременных запросов к модели
+        static_workers (int): количество процессов статического анализа
+        progress (Optional[Callable[[str, float], None]]): функция, которой передаются
+            текущий этап и доля выполненной работы (от 0 до 1)
+        run_id (Optional[str]): уникальный идентификатор запуска для имен временных папок
+
+    Returns:
+        Report: отчет
+    """
+    if progress is None:
+        progress = lambda stage, fraction: None
+    diff_output_dir = f'diff-{run_id or uuid.uuid4().hex}'
+
+    progress("загрузка PR", 0.0)
+
+    # диффы удаляются и в том случае, если загрузка прервалась на середине
+    try:
+        diffs = get_diffs(
+            github_url=github_url,
+            email=email,
+            start_date=start_date,
+            end_date=end_date,
+            # токен гитхаба из переменных окружения
+            access_token=access_token,
+            output_dir=diff_output_dir,
+            # для статического анализа загружаются полные версии файлов после мерджа
+            source_suffixes=list(ANALYZERS)
+        )
+        return analyze_author_diffs(github_url, email, diffs, start_date, end_date,
+                                    llm_parallel, static_workers, progress)
+    finally:
+        delete_dir(diff_output_dir)
+
+def analyze_author_diffs(github_url: str,
+    email: str,
+    diffs: List[Dict],
+    start_date: datetime,
+    end_date: datetime,
+    llm_parallel: int = OLLAMA_NUM_PARALLEL,
+    static_workers: int = STATIC_ANALYSIS_WORKERS,
+    progress: Optional[Callable[[str, float], None]] = None,
+    review: bool = True,
+    llm_pool: Optional[ThreadPoolExecutor] = None,
+    static_pool: Optional[ProcessPoolExecutor] = None) -> Report:
+
+    """
+    Анализ загруженных диффов PR автора и формирование данных отчета
+
+    Args:
+        github_url (str): ссылка на репозиторий
+        email (str): почта автора
+        diffs (List[Dict]): диффы PR автора (результат get_diffs)
+        start_date (datetime): дата начала анализа
+        end_date (datetime): дата конца анализа
+        llm_parallel (int): количество одновременных запросов к модели
+        static_workers (int): количество процессов статического анализа
+        progress (Optional[Callable[[str, float], None]]): функция, которой передаются
+            текущий этап и доля выполненной работы (от 0 до 1)
+        review (bool): формировать итоговый обзор (False - обзор формируется позже по объединенному отчету)
+        llm_pool (Optional[ThreadPoolExecutor]): общая очередь запросов к модели для нескольких отчетов
+        static_pool (Optional[ProcessPoolExecutor]): общий пул процессов статического анализа
+
+    Returns:
+        Report: отчет
+    """
+    if progress is None:
+        progress = lambda stage, fraction: None
+
+    # если PR не найдены, в отчете указывается email
+    author = email
     for diff in diffs:
         logger.info(f"PR #{diff['pr_number']}: {diff['title']} (Diff saved to {diff['diff_path']})")
         author = diff['author']
@@ -55,105 +391,176 @@ def form_report(github_url: str,
     
     file_count = 0
     score = 0
-    history_file = f'history-{author}-{time}.txt'
-
-    report = Document()
-    report.add_heading('Отчет об оценке качества кода', 0)
-    p = report.add_paragraph()
-    report.add_heading(f'Автор: {author}', level=1)
-    report.add_heading('Выявленные проблемы', level=1)
+    owner, repo_name = parse_github_url(github_url)
+    report = Report(
+        author=author, email=email, repository=f"{owner}/{repo_name}",
+        start_date=start_date, end_date=end_date, generated_at=datetime.now()
+    )
 
+    # PR, которые уже анализировались с теми же коммитами автора, моделью и промптом, берутся из хранилища
+    pr_records = get_pr_records()
+    record_keys = {
+        diff['pr_number']: pr_record_key(f"{owner}/{repo_name}", diff, f"{MODEL_NAME}:{PROMPT_VERSION}:static-{STATIC_ANALYSIS_VERSION}")
+        for diff in diffs
+    }
+    saved_records = {}
     for diff in diffs:
-        p = report.add_paragraph()
-        p.add_run('\nНОМЕР МР: ').bold = True
-        p.add_run(str(diff["pr_number"]))
-        p = report.add_paragraph()
-        p.add_run('КОММИТ: ').bold = True
-        p.add_run(str(diff["commit_sha"]))
-
-        time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        output_dir = f'restored/{author}-{time}'
-
-        diff_dict = analyze_diff_and_write_in_docx(diff, output_dir, report, history_file)
-                    
-        for key, value in diff_dict.items():
-            file_count += key
-            score += value
-        
-    make_review_and_write_in_docx(report, history_file)
-
+        record = load_pr_record(pr_records, record_keys[diff['pr_number']])
+        if record is not None:
+            saved_records[diff['pr_number']] = record
+    logger.info(f"Результаты анализа из предыдущих отчетов: {len(saved_records)} из {len(diffs)} PR")
+    new_diffs = [diff for diff in diffs if diff['pr_number'] not in saved_records]
+
+    # статический анализ новых PR идет в отдельных процессах одновременно с запросами к модели
+    own_static_pool = static_pool is None
+    if own_static_pool:
+        static_pool = ProcessPoolExecutor(max_workers=max(static_workers, 1))
+    try:
+        stat_futures = submit_stat_analysis(static_pool, new_diffs, static_workers)
+
+        for index, diff in enumerate(diffs):
+            # загрузка PR - первые 10%, анализ PR - до 90%
+            progress(f"анализ PR {index + 1}/{len(diffs)}", 0.1 + 0.8 * index / len(diffs))
+
+            saved_record = saved_records.get(diff['pr_number'])
+            record = saved_record or analyze_diff(diff, stat_futures.get(diff['pr_number']), llm_parallel, llm_pool)
+            add_pr_analysis(report, diff, record)
+            # сохраняем только полный результат, иначе PR будет проанализирован заново в следующий раз
+            complete = record['stat_result'] is not None and all(verdict is not None for _, verdict in record['files'])
+            if saved_record is None and complete:
+                save_pr_record(pr_records, record_keys[diff['pr_number']], record)
+
+            file_count += record['analyzed_count']
+            score += record['score']
+    finally:
+        if own_static_pool:
+            static_pool.shutdown()
+
+    if review:
+        progress("итоговый обзор", 0.9)
+        history = review_history(report)
+        if history.is_empty():
+            # без PR и оценок модели обзор строить не по чему, запрос к модели не отправляется
+            logger.info("Нет данных для итогового обзора")
+        else:
+            report.review = make_review(history)
+    logger.info(f"Кэш ответов модели: {get_llm_cache().stats()}")
+
+    report.analyzed_files = file_count
     if file_count != 0:
-        score /= file_count * 10
-
-        p = report.add_paragraph()
-        p.add_run('\nОЦЕНКА LLM-АНАЛИЗА: ').bold = True
-        p.add_run(f'{str(score)}/10')
+        report.score = score / (file_count * 10)
 
-    report_name = f'report-{author}-{time}'
-    report.save(f'{report_name}.docx')
-    convert(report_name +'.docx', report_name + '.pdf')
+    return report
 
-    delete_dir('restored')
-    delete_dir(diff_output_dir)
-    delete_file(report_name +'.docx')
-    delete_file(history_file)
-
-    return report_name + '.pdf'
-
-def analyze_diff_and_write_in_docx(diff: str, output_dir: str, docx: str, history_file: str) -> None:
+def analyze_diff(diff: Dict, stat_future: Optional[Future] = None,
+                 llm_parallel: int = OLLAMA_NUM_PARALLEL,
+                 llm_pool: Optional[ThreadPoolExecutor] = None) -> Dict:
     """
-    Анализ diff файла и запись результата в файл отчета
+    Анализ diff файла PR моделью и статическими анализаторами.
+    Файлы анализируются параллельно (большие - по частям, мелкие - пачками)
     Args:
-        diff (str): путь к diff файлу
-        output_dir (str): директория для сохранения файлов
-        docx (str): путь к файлу с отчетом
-        history_file (str): путь к файлу с историей анализов
+        diff (Dict): информация о PR (элемент результата get_diffs)
+        stat_future (Optional[Future]): статический анализ PR, запущенный в пуле процессов (submit_stat_analysis);
+            результат ожидается после анализа файлов моделью
+        llm_parallel (int): количество одновременных запросов к модели
+        llm_pool (Optional[ThreadPoolExecutor]): общая очередь запросов к модели (вместо llm_parallel)
     Returns:
-        None
+        Dict: результат анализа PR: files - пары [файл, результат модели или None],
+            stat_result - находки статического анализа (None, если анализ не удался),
+            analyzed_count - количество проанализированных моделью файлов,
+            score - сумма очков за каждый критерий * вес критерия
     """
-    # сумма очков за каждый критерий * вес критерия
     score = 0
 
-    # парсим диффы в файлы с кодом с сохраннием структуры папок
-    diff_path = diff['diff_path']
-    parse_diff_to_code_files(diff_path, output_dir)
-    diff_files = get_files_in_dir(output_dir)
+    # восстанавливаем код файлов из диффа в памяти
+    with timed("diff_restore"):
+        codes = dict(iter_restored_files(diff['diff_path']))
+    # количество файлов, для которых модель вернула корректный результат
+    analyzed_count = 0
 
-    for file in diff_files:
-        code = read_file(file)
-        prompt = make_prompt(code)
-        ai_result = mistral_analyze(prompt)
-
-        # записываем результат в файл истории
-        write_file(history_file, f"User: {prompt}\nAssistant: {ai_result}\n")
-
-        p = docx.add_paragraph()
-        p.add_run(f"ФАЙЛ: {file}\n").bold = True
-        write_json_to_docx_file(docx, ai_result)
+    # до llm_parallel запросов к модели одновременно
+    with timed("llm_analysis"):
+        results = analyze_files(codes, parallel=llm_parallel, executor=llm_pool)
 
+    for ai_result in results.values():
+        if ai_result is None:
+            continue
+        analyzed_count += 1
         for key in ai_result.keys():
             small_json = ai_result[key]
             score += small_json['score'] * WEIGHTS[key]
 
-    stat_result = stat_analyze_diff(diff)
-    stat_text_result = f'Vulnerabilities: {stat_result['bandit_issues']}\nPoor code style: {stat_result['flake8_issues']}'
-    write_file(history_file, f"User: Great! Now find vulnerabilities and poor code style\nAssistant: {stat_text_result}\n")
-
-    write_to_docx_file(docx, 'Vulnerabilities:', stat_result['bandit_issues'])
-    write_to_docx_file(docx, 'Poor code style:', stat_result['flake8_issues'])
+    stat_result = get_stat_result(stat_future, diff['pr_number'])
+    if stat_result is not None:
+        stat_result = {
+            'bandit_issues': stat_result['bandit_issues'],
+            'flake8_issues': stat_result['flake8_issues'],
+            'not_analyzed': stat_result['not_analyzed_files'],
+        }
 
-    # возвращаем словарь {кол-во файлов: общая оценка} для формирования оценки LLM-анализа разработчика
-    return {len(diff_files): score}
+    return {
+        'files': [[file, results[file]] for file in codes],
+        'stat_result': stat_result,
+        'analyzed_count': analyzed_count,
+        'score': score,
+    }
 
-def make_review_and_write_in_docx(docx: str, history_file: str) -> None:
+def add_pr_analysis(report: Report, diff: Dict, record: Dict) -> None:
     """
-    Формирование общего обзора о разработчике на основе истории анализов с помощью модели Mistral
+    Добавление результата анализа PR в данные отчета
     Args:
-        docx (str): путь к файлу с отчетом
-        history_file (str): путь к файлу с историей анализов
+        report (Report): отчет
+        diff (Dict): информация о PR (элемент результата get_diffs)
+        record (Dict): результат анализа PR (analyze_diff)
     Returns:
         None
     """
+    stat_result = record['stat_result']
+    if stat_result is None:
+        # анализ не удался: файлы, которые умеют проверять анализаторы, не считаются чистыми
+        stat_result = {'not_analyzed': [
+            file for file, _ in record['files'] if Path(file).suffix.lower() in ANALYZERS
+        ]}
+
+    report.prs.append(PullRequestReport(
+        pr_number=diff['pr_number'],
+        title=diff['title'],
+        commit_sha=diff['commit_sha'],
+        files=[FileReport(file=file, verdict=ai_result) for file, ai_result in record['files']],
+        static=StaticFindings(**stat_result),
+        score=record['score'] / (record['analyzed_count'] * 10) if record['analyzed_count'] else None,
+    ))
+
+def review_history(report: Report) -> ReviewHistory:
+    """
+    История анализов для итогового обзора по данным отчета (в порядке PR)
+    Args:
+        report (Report): отчет
+    Returns:
+        ReviewHistory: история анализов
+    """
+    history = ReviewHistory(summarize=summarize_history)
+    for pr in report.prs:
+        verdicts = [file_report for file_report in pr.files if file_report.verdict is not None]
+        # файлы без результата модели не попадают в историю
+        for file_report in verdicts:
+            history.add_file_verdict(pr.pr_number, file_report.file, file_report.verdict.model_dump())
+        # PR без оценок модели и без находок анализаторов ничего не добавляет к обзору
+        if verdicts or pr.static.bandit_issues or pr.static.flake8_issues:
+            history.add_static_findings(pr.pr_number, {
+                'Vulnerabilities': [issue.model_dump() for issue in pr.static.bandit_issues],
+                'Poor code style': [issue.model_dump() for issue in pr.static.flake8_issues]
+            })
+    return history
+
+def make_review(history: ReviewHistory) -> Optional[OverallReview]:
+    """
+    Формирование общего обзора о разработчике на основе истории анализов с помощью модели Mistral
+    Args:
+        history (ReviewHistory): история анализов
+    Returns:
+        Optional[OverallReview]: обзор или None, если модель не вернула корректный ответ
+    """
 
     review_prompt = """
         You are an experienced team leader and code reviewer. Your job is to give the developer feedback on the quality of their code.
@@ -176,7 +583,14 @@ def make_review_and_write_in_docx(docx: str, history_file: str) -> None:
 
         Do not include 'legacy_context' and 'forced_solution' into the final response's JSON!!!
         """
-    history = read_file(history_file)
-    result = mistral_analyze(review_prompt, history)
-
-    write_json_to_docx_file(docx, result)
+    # одна повторная попытка, если ответ не соответствует схеме
+    for attempt in range(2):
+        try:
+            result = parse_review(mistral_analyze(review_prompt, history.render(), schema=review_schema()))
+        except json.JSONDecodeError:
+            result = None
+        if result is not None:
+            return OverallReview(**result["Overall Review"])
+        logger.warning(f"Итоговый обзор не соответствует схеме, попытка {attempt + 1}/2")
+    logger.error("Не удалось сформировать итоговый обзор")
+    return None
@@ -0,0 +1,319 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.cache_work import SqliteCache
+from utils.metrics_work import METRICS
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API_URL = "https://api.github.com"
+# Кэш ETag: ответы, не изменившиеся с прошлого запроса, приходят как 304 и не расходуют квоту
+ETAG_CACHE_PATH = os.getenv("GITHUB_ETAG_CACHE_PATH", ".cache/github_etags.sqlite")
+ETAG_CACHE_MAX_BYTES = int(os.getenv("GITHUB_ETAG_CACHE_MAX_MB", "256")) * 1024 * 1024
+# Ограничение одновременных запросов к GitHub для всех репозиториев отчета по нескольким репозиториям
+GITHUB_MAX_CONCURRENT = int(os.getenv("GITHUB_MAX_CONCURRENT", "8"))
+# Сколько раз повторять запрос после исчерпания лимита или ошибки сервера
+MAX_ATTEMPTS = 5
+
+_etag_cache = None
+_etag_cache_lock = threading.Lock()
+
+class GithubApiError(Exception):
+    """
+    Ошибка ответа GitHub API
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+def get_etag_cache() -> SqliteCache:
+    """
+    Возвращает общий для процесса кэш ETag, создавая его при первом обращении.
+
+    Returns:
+        SqliteCache: Кэш ETag и тел ответов.
+    """
+    global _etag_cache
+    with _etag_cache_lock:
+        if _etag_cache is None:
+            _etag_cache = SqliteCache(ETAG_CACHE_PATH, ETAG_CACHE_MAX_BYTES)
+        return _etag_cache
+
+class RateLimitScheduler:
+    """
+    Планировщик запросов к GitHub API с учетом оставшейся квоты.
+    Квота отслеживается отдельно для каждого ресурса (core, search, ...) по заголовкам X-RateLimit-*.
+    Когда квота на исходе, запросы равномерно распределяются до момента сброса;
+    когда квота исчерпана, запросы ждут сброса вместо ошибки.
+    Каждый запрос резервирует под блокировкой ближайшее время отправки для своего ресурса,
+    а ждет уже без блокировки, поэтому ожидание сброса квоты поиска не задерживает запросы к core.
+    """
+    def __init__(self, min_interval: float = 0.1, pace_ratio: float = 0.2, max_concurrent: Optional[int] = None):
+        """
+        Args:
+            min_interval (float): Минимальный интервал между запросами в секундах
+                (держит темп ниже вторичных лимитов GitHub).
+            pace_ratio (float): Доля оставшейся квоты, ниже которой запросы растягиваются до сброса.
+            max_concurrent (Optional[int]): Максимальное количество одновременных запросов всех клиентов
+                с этим планировщиком (None - без ограничения).
+        """
+        self.min_interval = min_interval
+        self.pace_ratio = pace_ratio
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self._lock = threading.Lock()
+        # ресурс -> время, раньше которого следующий запрос к ресурсу не отправляется
+        self._next_slot = {}
+        # ресурс -> {'limit', 'remaining', 'reset'}
+        self._limits = {}
+        self._blocked_until = {}
+
+    def wait(self, resource: str = "core") -> None:
+        """
+        Ожидание перед запросом к указанному ресурсу.
+
+        Args:
+            resource (str): Ресурс квоты GitHub.
+        """
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next_slot.get(resource, 0.0), self._blocked_until.get(resource, 0.0))
+            interval = self.min_interval
+
+            limit = self._limits.get(resource)
+            if limit and limit['reset'] > now:
+                if limit['remaining'] <= 0:
+                    start = max(start, limit['reset'] + 1)
+                elif limit['remaining'] < limit['limit'] * self.pace_ratio:
+                    interval = max(interval, (limit['reset'] - now) / limit['remaining'])
+
+            # следующий запрос к ресурсу - не раньше чем через interval после этого
+            self._next_slot[resource] = start + interval
+
+        delay = start - now
+        if delay > 1:
+            logger.info(f"Квота GitHub API ({resource}) на исходе, ожидание {delay:.1f} с")
+        if delay > 0:
+            time.sleep(delay)
+
+    @contextmanager
+    def slot(self):
+        """
+        Место для одного запроса в пределах max_concurrent: запрос выполняется внутри блока with.
+        """
+        if self._slots is None:
+            yield
+            return
+        with self._slots:
+            yield
+
+    def update(self, headers) -> None:
+        """
+        Обновление состояния квоты по заголовкам ответа.
+
+        Args:
+            headers: Заголовки ответа GitHub.
+        """
+        if 'X-RateLimit-Remaining' not in headers:
+            return
+        resource = headers.get('X-RateLimit-Resource', 'core')
+        METRICS.set("code_review_github_ratelimit_remaining", int(headers['X-RateLimit-Remaining']),
+                    "Остаток квоты GitHub API", resource=resource)
+        with self._lock:
+            self._limits[resource] = {
+                'limit': int(headers.get('X-RateLimit-Limit', 0)),
+                'remaining': int(headers['X-RateLimit-Remaining']),
+                'reset': float(headers.get('X-RateLimit-Reset', 0)),
+            }
+
+    def block(self, resource: str, seconds: float) -> None:
+        """
+        Приостановка запросов к ресурсу (после 403/429 с Retry-After).
+
+        Args:
+            resource (str): Ресурс квоты GitHub.
+            seconds (float): Длительность паузы.
+        """
+        with self._lock:
+            self._blocked_until[resource] = max(self._blocked_until.get(resource, 0.0), time.time() + seconds)
+
+class GithubClient:
+    """
+    Клиент REST API GitHub с условными запросами (ETag / If-None-Match)
+    и ожиданием сброса квоты вместо прерывания отчета.
+    """
+    def __init__(
+        self,
+        access_token: Optional[str] = None,
+        base_url: str = GITHUB_API_URL,
+        scheduler: Optional[RateLimitScheduler] = None,
+        etag_cache: Optional[SqliteCache] = None,
+        per_page: int = 100,
+        pool_size: int = 10,
+        timeout: float = 30
+    ):
+        """
+        Args:
+            access_token (Optional[str]): Токен доступа к GitHub API.
+            base_url (str): Адрес API (для GitHub Enterprise или тестового сервера).
+            scheduler (Optional[RateLimitScheduler]): Планировщик запросов; можно разделять между клиентами.
+            etag_cache (Optional[SqliteCache]): Кэш ETag; None - условные запросы не используются.
+            per_page (int): Размер страницы для списков.
+            pool_size (int): Размер пула соединений.
+            timeout (float): Таймаут запроса в секундах.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.etag_cache = etag_cache
+        self.per_page = per_page
+        self.timeout = timeout
+        self.stats = {'requests': 0, 'not_modified': 0}
+        self._stats_lock = threading.Lock()
+        # Ответы зависят от прав токена, поэтому ключи кэша разделяются по токену
+        self._cache_namespace = hashlib.sha256((access_token or "").encode()).hexdigest()[:16]
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/vnd.github+json',
+            'X-GitHub-Api-Version': '2022-11-28',
+        })
+        if access_token:
+            self.session.headers['Authorization'] = f"Bearer {access_token}"
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def request(self, path: str, params: Optional[Dict] = None, conditional: bool = True) -> Tuple[object, Dict]:
+        """
+        GET-запрос к API. Если ответ есть в кэше ETag, запрос отправляется условным,
+        и при 304 возвращается сохраненный ответ.
+
+        Args:
+            path (str): Путь (/repos/...) или полный URL.
+            params (Optional[Dict]): Параметры запроса.
+            conditional (bool): Использовать кэш ETag (для неизменяемых ресурсов есть свои кэши).
+
+        Returns:
+            Tuple[object, Dict]: Тело ответа (JSON) и ссылки пагинации (rel -> URL).
+        """
+        url = path if path.startswith('http') else f"{self.base_url}{path}"
+        resource = 'search' if '/search/' in url else 'core'
+        cache_key = None
+        cached = None
+        if conditional and self.etag_cache is not None:
+            cache_key = f"{self._cache_namespace}:{url}?{json.dumps(params or {}, sort_keys=True)}"
+            cached_value = self.etag_cache.get(cache_key)
+            cached = json.loads(cached_value) if cached_value else None
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            headers = {'If-None-Match': cached['etag']} if cached else {}
+            self.scheduler.wait(resource)
+            try:
+                with self.scheduler.slot():
+                    response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # ReadTimeout не является ConnectionError, поэтому таймауты перечислены отдельно
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                logger.warning(f"Ошибка соединения с GitHub или таймаут ({e}), повтор {attempt}/{MAX_ATTEMPTS}")
+                time.sleep(2 ** attempt)
+                continue
+            self._count('requests')
+            METRICS.inc("code_review_github_requests_total", help_text="Запросы к GitHub API",
+                        resource=resource, status=response.status_code)
+            self.scheduler.update(response.headers)
+
+            if response.status_code == 304 and cached:
+                self._count('not_modified')
+                return cached['data'], cached['links']
+
+            if response.status_code in (403, 429) and self._is_rate_limited(response):
+                if attempt == MAX_ATTEMPTS:
+                    break
+                retry_after = response.headers.get('Retry-After')
+                if retry_after:
+                    self.scheduler.block(resource, float(retry_after))
+                elif response.headers.get('X-RateLimit-Remaining') != '0':
+                    # Вторичный лимит без Retry-After: GitHub рекомендует подождать минуту
+                    self.scheduler.block(resource, 60)
+                logger.warning(f"Достигнут лимит GitHub API ({resource}), ожидание сброса квоты")
+                continue
+
+            if response.status_code >= 500 and attempt < MAX_ATTEMPTS:
+                logger.warning(f"GitHub вернул {response.status_code}, повтор {attempt}/{MAX_ATTEMPTS}")
+                time.sleep(2 ** attempt)
+                continue
+
+            if response.status_code >= 400:
+                break
+
+            data = response.json()
+            links = {rel: link['url'] for rel, link in response.links.items()}
+            etag = response.headers.get('ETag')
+            if cache_key and etag:
+                self.etag_cache.set(cache_key, json.dumps({'etag': etag, 'data': data, 'links': links}))
+            return data, links
+
+        try:
+            message = response.json().get('message', response.text)
+        except ValueError:
+            message = response.text
+        raise GithubApiError(response.status_code, message)
+
+    def paginate(
+        self,
+        path: str,
+        params: Optional[Dict] = None,
+        item_key: Optional[str] = None,
+        stats: Optional[Dict] = None,
+        first_page: Optional[Tuple[object, Dict]] = None
+    ) -> Iterator[Dict]:
+        """
+        Обход всех страниц списка по ссылкам rel="next".
+
+        Args:
+            path (str): Путь к списку.
+            params (Optional[Dict]): Параметры запроса.
+            item_key (Optional[str]): Ключ списка в ответе (например, items для поиска).
+            stats (Optional[Dict]): Словарь, в котором увеличивается счетчик pages.
+            first_page (Optional[Tuple[object, Dict]]): Уже загруженная первая страница
+                (результат request с per_page клиента), чтобы не запрашивать ее повторно.
+
+        Returns:
+            Iterator[Dict]: Итератор по элементам списка.
+        """
+        url = path
+        params = {**(params or {}), 'per_page': self.per_page}
+        while url:
+            if first_page is not None:
+                (data, links), first_page = first_page, None
+            else:
+                data, links = self.request(url, params)
+            if stats is not None:
+                stats['pages'] = stats.get('pages', 0) + 1
+            yield from (data[item_key] if item_key else data)
+            url = links.get('next')
+            # В ссылке next параметры уже указаны
+            params = None
+
+    @staticmethod
+    def _is_rate_limited(response: requests.Response) -> bool:
+        """
+        Проверяет, что 403/429 вызван лимитом запросов, а не отсутствием доступа.
+        """
+        if response.headers.get('Retry-After') or response.headers.get('X-RateLimit-Remaining') == '0':
+            return True
+        return 'rate limit' in response.text.lower()
@@ -1,43 +1,112 @@
 # main.py
-from download_repo import get_diffs
-from analyze.static_analysis import stat_analyze_diff
+import argparse
+import json
 import os
 from datetime import datetime, timezone
 import logging
 from form_report import *
+from utils.metrics_work import track_run
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def parse_date(value: str) -> datetime:
+    """
+    Дата из командной строки (YYYY-MM-DD или ISO 8601); без часового пояса считается UTC
+    Args:
+        value: дата
+    Returns:
+        datetime: дата с часовым поясом
+    """
+    date = datetime.fromisoformat(value)
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+def parse_end_date(value: str) -> datetime:
+    """
+    Дата конца анализа из командной строки. Дата без времени (YYYY-MM-DD) включает весь день,
+    поэтому PR, смердженные в этот день, попадают в отчет
+    Args:
+        value: дата
+    Returns:
+        datetime: дата с часовым поясом (для даты без времени - конец дня в UTC)
+    """
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return parse_date(value)
+    return datetime.combine(day, datetime.max.time(), tzinfo=timezone.utc)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Разбор аргументов командной строки
+    Args:
+        argv: аргументы (по умолчанию sys.argv)
+    Returns:
+        argparse.Namespace: аргументы
+    """
+    parser = argparse.ArgumentParser(
+        description="Отчет о качестве кода разработчика по смердженным PR. "
+                    "Один --repo и один --email - отчет автора; несколько --email или --all-authors - "
+                    "отчеты команды по одному репозиторию; несколько --repo или --org - один отчет автора "
+                    "по всем репозиториям."
+    )
+    parser.add_argument("--repo", action="append", default=[], help="ссылка на репозиторий (можно указать несколько раз)")
+    parser.add_argument("--org", action="append", default=[],
+                        help="организация или пользователь GitHub: в отчет входят все их репозитории, кроме форков")
+    parser.add_argument("--email", action="append", default=[], help="почта автора (можно указать несколько раз)")
+    parser.add_argument("--all-authors", action="store_true", help="отчеты для всех авторов смердженных PR")
+    parser.add_argument("--start", type=parse_date, required=True, help="дата начала анализа (YYYY-MM-DD)")
+    parser.add_argument("--end", type=parse_end_date, default=datetime.now(timezone.utc),
+                        help="дата конца анализа (YYYY-MM-DD, день включается целиком; по умолчанию - сейчас)")
+    parser.add_argument("--format", choices=sorted(REPORT_FORMATS), default="pdf", help="формат отчета")
+    parser.add_argument("--token", default=os.getenv("GITHUB_TOKEN"),
+                        help="токен GitHub (по умолчанию переменная окружения GITHUB_TOKEN)")
+    parser.add_argument("--llm-parallel", type=int, default=OLLAMA_NUM_PARALLEL,
+                        help="количество одновременных запросов к модели")
+    parser.add_argument("--static-workers", type=int, default=STATIC_ANALYSIS_WORKERS,
+                        help="количество процессов статического анализа")
+    parser.add_argument("--repo-workers", type=int, default=REPO_WORKERS,
+                        help="количество одновременно обрабатываемых репозиториев")
+    args = parser.parse_args(argv)
+
+    if not args.repo and not args.org:
+        parser.error("укажите --repo или --org")
+    if not args.email and not args.all_authors:
+        parser.error("укажите --email или --all-authors")
+    team = args.all_authors or len(args.email) > 1
+    if team and (args.org or len(args.repo) > 1):
+        parser.error("отчеты команды формируются по одному репозиторию (--repo без --org)")
+    return args
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    with track_run() as timing:
+        run(args)
+    logger.info(f"Время формирования отчета: {json.dumps(timing.as_dict(), ensure_ascii=False)}")
+
+def run(args: argparse.Namespace) -> None:
+    options = dict(
+        start_date=args.start,
+        end_date=args.end,
+        access_token=args.token,
+        llm_parallel=args.llm_parallel,
+        static_workers=args.static_workers,
+        report_format=args.format,
+    )
+
+    if args.all_authors or len(args.email) > 1:
+        summary_path, report_paths = form_team_reports(
+            args.repo[0], None if args.all_authors else args.email, **options
+        )
+        for path in report_paths.values():
+            print(path)
+        print(summary_path)
+    elif args.org or len(args.repo) > 1:
+        print(form_multi_repo_report(
+            args.repo, args.email[0], orgs=args.org, repo_workers=args.repo_workers, **options
+        ))
+    else:
+        print(form_report(github_url=args.repo[0], email=args.email[0], **options))
+
 if __name__ == "__main__":
-    # Пример использования
-    #try:
-        # github_url = "https://github.com/AlfaInsurance/devQ_testData_PythonProject"
-        # email = "avasilev1992@gmail.com"
-
-        github_url="https://github.com/natasha/natasha"
-        email="122558239+the-lenoz@users.noreply.github.com"
-
-        # diffs = get_diffs(
-        #     github_url=github_url,
-        #     email=email,
-        #     start_date=datetime(2023, 1, 1, tzinfo=timezone.utc),
-        #     end_date=datetime(2025, 4, 17, tzinfo=timezone.utc),
-        #     # токен гитхаба из переменных окружения
-        #     access_token=os.getenv("GITHUB_TOKEN"),
-        #     output_dir="diffs"
-        # )
-
-        # for diff in diffs:
-        #     print(stat_analyze_diff(diff))
-
-        result = form_report(github_url=github_url,
-            email=email,
-            start_date=datetime(2023, 1, 1, tzinfo=timezone.utc),
-            end_date=datetime(2025, 4, 17, tzinfo=timezone.utc),
-            access_token=os.getenv("GITHUB_TOKEN"))
-        
-        print(result)
-            
-    # except Exception as e:
-    #     logger.error(f"Ошибка: {str(e)}")
\ No newline at end of file
+    main()
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from report_model import Report, render_report
+from utils.cache_work import SqliteCache
+from utils.file_work import delete_file
+from utils.metrics_work import METRICS, RunTiming, record, timed, track_run
+
+logger = logging.getLogger(__name__)
+
+# Количество отчетов, формируемых одновременно (остальные ждут в очереди)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Количество одновременных проверок кэша отчетов (отпечаток PR - несколько легких запросов к GitHub);
+# проверки идут в отдельном пуле и не занимают места формирования отчетов
+CACHE_CHECK_WORKERS = int(os.getenv("CACHE_CHECK_WORKERS", "4"))
+# Сколько секунд хранить завершенные задачи и их отчеты
+REPORT_JOB_TTL = int(os.getenv("REPORT_JOB_TTL", str(24 * 60 * 60)))
+# Кэш готовых отчетов: ключ - параметры запроса (кроме формата) и отпечаток смердженных PR
+REPORT_CACHE_PATH = os.getenv("REPORT_CACHE_PATH", ".cache/reports.sqlite")
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_MB", "512")) * 1024 * 1024
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_report_cache = None
+_report_cache_lock = threading.Lock()
+
+def get_report_cache() -> SqliteCache:
+    """
+    Возвращает общий для процесса кэш готовых отчетов, создавая его при первом обращении.
+
+    Returns:
+        SqliteCache: Кэш отчетов (данные отчета в JSON, см. Report.model_dump_json).
+    """
+    global _report_cache
+    with _report_cache_lock:
+        if _report_cache is None:
+            _report_cache = SqliteCache(REPORT_CACHE_PATH, REPORT_CACHE_MAX_BYTES, ttl=REPORT_CACHE_TTL)
+        return _report_cache
+
+def report_params(params: Dict) -> Dict:
+    """
+    Параметры данных отчета: параметры задачи без формата вывода
+
+    Args:
+        params (Dict): Параметры задачи.
+
+    Returns:
+        Dict: Параметры функции формирования данных отчета.
+    """
+    return {name: value for name, value in params.items() if name != "report_format"}
+
+def request_key(params: Dict) -> str:
+    """
+    Ключ параметров запроса: одинаковые запросы объединяются в одну задачу.
+    Токен входит в ключ в виде хэша, потому что от него зависит доступ к репозиторию.
+
+    Args:
+        params (Dict): Параметры задачи.
+
+    Returns:
+        str: Ключ (sha256 в hex).
+    """
+    key = {
+        name: value.isoformat() if hasattr(value, "isoformat") else value
+        for name, value in params.items() if name != "access_token"
+    }
+    key["access_token"] = hashlib.sha256((params.get("access_token") or "").encode()).hexdigest()
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+class ReportJobs:
+    """
+    Очередь задач формирования отчетов.
+    Задача выполняется в пуле потоков, поэтому запрос на отчет возвращает id задачи сразу,
+    а состояние, прогресс и готовый отчет можно получить по id.
+    Одинаковый запрос, пока задача по нему в очереди или выполняется, получает id этой же задачи.
+    Данные готовых отчетов кэшируются по параметрам (кроме формата) и отпечатку смердженных PR
+    и выводятся в запрошенный формат сразу, пока в окне не появятся новые PR. Кэш проверяется в отдельном пуле до постановки в очередь
+    формирования, поэтому попадания в кэш не ждут, пока освободится место для тяжелого отчета.
+    """
+    def __init__(
+        self,
+        run: Callable[..., Report],
+        workers: int = REPORT_WORKERS,
+        ttl: int = REPORT_JOB_TTL,
+        fingerprint: Optional[Callable[[Dict], str]] = None,
+        cache: Optional[SqliteCache] = None
+    ):
+        """
+        Args:
+            run (Callable[..., Report]): Функция формирования данных отчета (build_report); принимает
+                параметры задачи без report_format и функцию progress(stage, fraction), возвращает Report.
+                Отчет выводится в формат report_format через render_report.
+            workers (int): Количество одновременно формируемых отчетов.
+            ttl (int): Время хранения завершенных задач в секундах.
+            fingerprint (Optional[Callable[[Dict], str]]): Функция, возвращающая отпечаток данных отчета
+                по параметрам задачи без report_format (например, набора смердженных PR).
+            cache (Optional[SqliteCache]): Кэш готовых отчетов; используется вместе с fingerprint.
+        """
+        self.run = run
+        self.ttl = ttl
+        self.fingerprint = fingerprint
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self._check_executor = ThreadPoolExecutor(max_workers=CACHE_CHECK_WORKERS, thread_name_prefix="report-cache")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+        # ключ запроса -> id задачи, которая в очереди или выполняется
+        self._active: Dict[str, str] = {}
+        self.stats = {"requests": 0, "coalesced": 0, "cache_hits": 0, "cache_misses": 0}
+
+    def submit(self, **params) -> str:
+        """
+        Постановка задачи в очередь.
+
+        Args:
+            **params: Параметры функции формирования отчета.
+
+        Returns:
+            str: id задачи.
+        """
+        self._cleanup()
+        key = request_key(params)
+        with self._lock:
+            self.stats["requests"] += 1
+            job_id = self._active.get(key)
+            if job_id is not None:
+                self.stats["coalesced"] += 1
+                logger.info(f"Запрос объединен с задачей {job_id}")
+                return job_id
+
+            job_id = uuid.uuid4().hex
+            self._active[key] = job_id
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": QUEUED,
+                "stage": "в очереди",
+                "progress": 0.0,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "report_path": None,
+                "cached": False,
+                "format": params.get("report_format", "pdf"),
+                # разбивка времени по этапам (заполняется по мере выполнения, см. RunTiming.as_dict)
+                "timing": None,
+            }
+        self._check_executor.submit(self._check_cache, job_id, key, params)
+        logger.info(f"Задача {job_id} поставлена в очередь")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        Состояние задачи.
+
+        Args:
+            job_id (str): id задачи.
+
+        Returns:
+            Optional[Dict]: Копия состояния задачи или None, если задачи нет.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+        if job["timing"] is not None:
+            job["timing"] = job["timing"].as_dict()
+        return job
+
+    def get_stats(self) -> Dict:
+        """
+        Статистика объединения запросов и кэша отчетов.
+
+        Returns:
+            Dict: Счетчики запросов, объединенных запросов, попаданий и промахов кэша и доля попаданий.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        checked = stats["cache_hits"] + stats["cache_misses"]
+        stats["cache_hit_rate"] = stats["cache_hits"] / checked if checked else 0.0
+        # доля запросов, обслуженных без нового расчета (кэш или уже идущая задача)
+        stats["reuse_rate"] = (stats["cache_hits"] + stats["coalesced"]) / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def get_status_counts(self) -> Dict[str, int]:
+        """
+        Количество задач в каждом статусе.
+
+        Returns:
+            Dict[str, int]: Статус -> количество задач.
+        """
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return counts
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _check_cache(self, job_id: str, key: str, params: Dict) -> None:
+        """
+        Проверка кэша отчетов до постановки в очередь формирования: при попадании отчет
+        выводится в нужный формат сразу, при промахе задача передается в пул формирования отчетов
+        """
+        self._update(job_id, stage="проверка кэша")
+        with track_run() as timing:
+            # время этапов видно в состоянии задачи еще до ее завершения
+            self._update(job_id, timing=timing)
+            try:
+                with timed("cache_check"):
+                    cache_key = self._cache_key(params)
+                    report = self._from_cache(job_id, cache_key)
+            except Exception as e:
+                logger.warning(f"Не удалось проверить кэш отчетов для задачи {job_id} ({e})")
+                cache_key, report = None, None
+            if report is not None:
+                self._update(job_id, started_at=time.time())
+                try:
+                    self._render(job_id, report, params)
+                except Exception as e:
+                    logger.exception(f"Ошибка при выполнении задачи {job_id}")
+                    self._update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+                finally:
+                    self._finish(job_id, key, timing)
+                return
+        # формирование продолжает тот же отчет; передается после выхода из track_run,
+        # чтобы время завершения проверки не перезаписало время начала формирования
+        self._update(job_id, stage="в очереди")
+        self._executor.submit(self._execute, job_id, key, params, cache_key, timing)
+
+    def _execute(self, job_id: str, key: str, params: Dict, cache_key: Optional[str], timing: RunTiming) -> None:
+        self._update(job_id, status=RUNNING, stage="запуск", started_at=time.time())
+
+        def progress(stage: str, fraction: float) -> None:
+            self._update(job_id, stage=stage, progress=round(min(max(fraction, 0.0), 1.0), 3))
+
+        # этапы записываются в тот же отчет, что и проверка кэша
+        with track_run(timing):
+            try:
+                report = self.run(**report_params(params), progress=progress)
+                if cache_key:
+                    self.cache.set(cache_key, report.model_dump_json())
+                self._render(job_id, report, params)
+            except Exception as e:
+                logger.exception(f"Ошибка при выполнении задачи {job_id}")
+                self._update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+            finally:
+                self._finish(job_id, key, timing)
+
+    def _render(self, job_id: str, report: Report, params: Dict) -> None:
+        """
+        Вывод отчета в формат, запрошенный в задаче, и завершение задачи
+        """
+        report_format = params.get("report_format", "pdf")
+        self._update(job_id, stage=f"формирование {report_format}", progress=0.95)
+        report_path = render_report(report, report_format, f"report-{job_id}")
+        self._update(job_id, status=DONE, stage="готово", progress=1.0,
+                     report_path=report_path, finished_at=time.time())
+        logger.info(f"Задача {job_id} завершена: {report_path}")
+
+    def _finish(self, job_id: str, key: str, timing: RunTiming) -> None:
+        """
+        Снятие задачи из активных и запись метрик завершенной задачи
+        """
+        with self._lock:
+            self._active.pop(key, None)
+            job = self._jobs[job_id]
+        record("report", job["finished_at"] - job["started_at"], timing)
+        METRICS.inc("code_review_reports_total", help_text="Завершенные задачи формирования отчетов",
+                    status=job["status"], cached=str(job["cached"]).lower())
+        logger.info(f"Время формирования отчета {job_id}: {json.dumps(timing.as_dict(), ensure_ascii=False)}")
+
+    def _cache_key(self, params: Dict) -> Optional[str]:
+        """
+        Ключ кэша отчетов: параметры запроса без формата и отпечаток данных отчета,
+        поэтому отчет, сформированный для одного формата, отдается и в остальных
+        Returns:
+            Optional[str]: ключ или None, если кэш не используется или отпечаток получить не удалось
+        """
+        if self.fingerprint is None or self.cache is None:
+            return None
+        params = report_params(params)
+        try:
+            return f"report:{request_key(params)}:{self.fingerprint(params)}"
+        except Exception as e:
+            logger.warning(f"Не удалось проверить актуальность кэша отчетов ({e}), отчет будет сформирован заново")
+            return None
+
+    def _from_cache(self, job_id: str, cache_key: Optional[str]) -> Optional[Report]:
+        """
+        Данные отчета из кэша
+        Returns:
+            Optional[Report]: отчет или None при промахе кэша
+        """
+        if cache_key is None:
+            return None
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            self._count("cache_misses")
+            return None
+        self._count("cache_hits")
+        self._update(job_id, cached=True)
+        logger.info(f"Отчет для задачи {job_id} взят из кэша")
+        return Report.model_validate_json(cached)
+
+    def _cleanup(self) -> None:
+        """
+        Удаление завершенных задач старше ttl вместе с файлами отчетов
+        """
+        now = time.time()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job["finished_at"] is not None and now - job["finished_at"] > self.ttl
+            ]
+            for job in expired:
+                del self._jobs[job["job_id"]]
+        for job in expired:
+            if job["report_path"]:
+                delete_file(job["report_path"])
@@ -0,0 +1,383 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from jinja2 import Environment
+from pydantic import BaseModel
+
+from analyze.verdict_schema import FileVerdict, OverallReview
+from utils.json_docx_work import write_report_docx, write_team_summary_docx
+from utils.pdf_work import write_report_pdf, write_team_summary_pdf
+from utils.metrics_work import timed
+
+# Форматы отчета: формат -> (расширение файла, MIME-тип)
+REPORT_FORMATS = {
+    "pdf": (".pdf", "application/pdf"),
+    "json": (".json", "application/json"),
+    "html": (".html", "text/html; charset=utf-8"),
+    "docx": (".docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+}
+
+class StaticIssue(BaseModel):
+    """
+    Находка статического анализатора
+    """
+    file: str
+    line: int
+    code: str
+    message: str
+    severity: str
+    column: Optional[int] = None
+    confidence: Optional[str] = None
+
+class StaticFindings(BaseModel):
+    """
+    Находки статического анализа PR
+    """
+    bandit_issues: List[StaticIssue] = []
+    flake8_issues: List[StaticIssue] = []
+    # файлы, которые анализаторы не проверяли (нет содержимого после мерджа или анализ не удался)
+    not_analyzed: List[str] = []
+
+class FileReport(BaseModel):
+    """
+    Результат анализа файла моделью (None, если модель не вернула корректный ответ)
+    """
+    file: str
+    verdict: Optional[FileVerdict] = None
+
+class PullRequestReport(BaseModel):
+    """
+    Результаты анализа PR
+    """
+    pr_number: int
+    title: str = ""
+    # репозиторий PR в отчете по нескольким репозиториям (owner/name)
+    repository: Optional[str] = None
+    commit_sha: Optional[str] = None
+    files: List[FileReport] = []
+    static: StaticFindings = StaticFindings()
+    # оценка LLM-анализа PR от 0 до 10 (None, если ни один файл не проанализирован)
+    score: Optional[float] = None
+
+class SkippedRepository(BaseModel):
+    """
+    Репозиторий, который не удалось обработать в отчете по нескольким репозиториям
+    """
+    repository: str
+    error: str
+
+class Report(BaseModel):
+    """
+    Отчет о качестве кода разработчика: формируется один раз и выводится в любом формате
+    """
+    author: str
+    email: str
+    repository: str
+    start_date: datetime
+    end_date: datetime
+    generated_at: datetime
+    prs: List[PullRequestReport] = []
+    review: Optional[OverallReview] = None
+    # количество файлов, проанализированных моделью
+    analyzed_files: int = 0
+    # оценка LLM-анализа всех PR от 0 до 10
+    score: Optional[float] = None
+    # репозитории, пропущенные из-за ошибок (отчет по нескольким репозиториям)
+    skipped_repositories: List[SkippedRepository] = []
+
+    def review_json(self) -> Optional[Dict]:
+        """
+        Итоговый обзор в формате ответа модели {"Overall Review": {...}}
+        Returns:
+            Optional[Dict]: обзор или None
+        """
+        return {"Overall Review": self.review.model_dump()} if self.review else None
+
+    @classmethod
+    def merge(cls, reports: List["Report"], skipped: Optional[List[SkippedRepository]] = None) -> "Report":
+        """
+        Объединение отчетов автора по нескольким репозиториям в один отчет.
+        Каждый PR помечается репозиторием, оценка - оценки репозиториев, взвешенные
+        по количеству проанализированных файлов. Итоговый обзор не переносится
+        (он формируется заново по объединенному отчету)
+        Args:
+            reports: отчеты по репозиториям (непустой список)
+            skipped: репозитории, которые не удалось обработать
+        Returns:
+            Report: объединенный отчет
+        """
+        files = sum(report.analyzed_files for report in reports if report.score is not None)
+        score = None
+        if files:
+            score = sum(report.score * report.analyzed_files for report in reports if report.score is not None) / files
+        # имя автора берется из отчета, в котором найдены его PR
+        author = next((report.author for report in reports if report.prs), reports[0].author)
+        return cls(
+            author=author,
+            email=reports[0].email,
+            repository=", ".join(report.repository for report in reports),
+            start_date=reports[0].start_date,
+            end_date=reports[0].end_date,
+            generated_at=datetime.now(),
+            prs=[
+                pr.model_copy(update={"repository": report.repository})
+                for report in reports for pr in report.prs
+            ],
+            analyzed_files=sum(report.analyzed_files for report in reports),
+            score=score,
+            skipped_repositories=skipped or [],
+        )
+
+class AuthorSummary(BaseModel):
+    """
+    Строка сводки по команде: итоги отчета одного автора
+    """
+    email: str
+    author: str
+    prs: int
+    analyzed_files: int
+    vulnerabilities: int
+    style_issues: int
+    score: Optional[float] = None
+    # имя файла отчета автора
+    report_file: Optional[str] = None
+
+    @classmethod
+    def from_report(cls, report: Report, report_file: Optional[str] = None) -> "AuthorSummary":
+        """
+        Итоги отчета автора
+        Args:
+            report: отчет автора
+            report_file: путь к файлу отчета
+        Returns:
+            AuthorSummary: итоги
+        """
+        return cls(
+            email=report.email,
+            author=report.author,
+            prs=len(report.prs),
+            analyzed_files=report.analyzed_files,
+            vulnerabilities=sum(len(pr.static.bandit_issues) for pr in report.prs),
+            style_issues=sum(len(pr.static.flake8_issues) for pr in report.prs),
+            score=report.score,
+            report_file=os.path.basename(report_file) if report_file else None,
+        )
+
+    def summary_lines(self) -> List[Tuple[str, str]]:
+        """
+        Итоги в виде пар (подпись, значение) для docx и pdf
+        Returns:
+            List[Tuple[str, str]]: строки сводки
+        """
+        return [
+            ('PR: ', str(self.prs)),
+            ('Проанализировано файлов: ', str(self.analyzed_files)),
+            ('Vulnerabilities: ', str(self.vulnerabilities)),
+            ('Poor code style: ', str(self.style_issues)),
+            ('ОЦЕНКА LLM-АНАЛИЗА: ', f"{self.score}/10" if self.score is not None else "нет данных"),
+            ('Отчет: ', self.report_file or "-"),
+        ]
+
+class TeamSummary(BaseModel):
+    """
+    Сводка по команде: итоги отчетов всех авторов за один проход по репозиторию
+    """
+    repository: str
+    start_date: datetime
+    end_date: datetime
+    generated_at: datetime
+    authors: List[AuthorSummary] = []
+    # оценка команды: оценки авторов, взвешенные по количеству проанализированных файлов
+    score: Optional[float] = None
+
+    @classmethod
+    def from_authors(cls, repository: str, start_date: datetime, end_date: datetime,
+                     authors: List[AuthorSummary]) -> "TeamSummary":
+        """
+        Сводка по итогам авторов
+        Args:
+            repository: полное имя репозитория (owner/name)
+            start_date: дата начала анализа
+            end_date: дата конца анализа
+            authors: итоги авторов
+        Returns:
+            TeamSummary: сводка
+        """
+        files = sum(author.analyzed_files for author in authors if author.score is not None)
+        score = None
+        if files:
+            score = sum(author.score * author.analyzed_files for author in authors if author.score is not None) / files
+        return cls(
+            repository=repository, start_date=start_date, end_date=end_date, generated_at=datetime.now(),
+            authors=sorted(authors, key=lambda author: author.email), score=score
+        )
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>Отчет об оценке качества кода: {{ report.author }}</title>
+<style>
+body { font-family: sans-serif; max-width: 960px; margin: 2em auto; }
+pre { background: #f5f5f5; padding: .5em; white-space: pre-wrap; }
+.label { font-weight: bold; }
+</style>
+</head>
+<body>
+<h1>Отчет об оценке качества кода</h1>
+<h2>Автор: {{ report.author }}</h2>
+<p>{{ report.repository }}, {{ report.start_date.date() }} - {{ report.end_date.date() }}</p>
+{% if report.skipped_repositories %}<h2>Пропущенные репозитории</h2>
+<ul>{% for skipped in report.skipped_repositories %}<li>{{ skipped.repository }}: {{ skipped.error }}</li>{% endfor %}</ul>{% endif %}
+<h2>Выявленные проблемы</h2>
+{% for pr in report.prs %}
+<section>
+{% if pr.repository %}<p><span class="label">РЕПОЗИТОРИЙ:</span> {{ pr.repository }}</p>{% endif %}
+<p><span class="label">НОМЕР МР:</span> {{ pr.pr_number }} {{ pr.title }}</p>
+<p><span class="label">КОММИТ:</span> {{ pr.commit_sha }}</p>
+{% for file in pr.files %}
+<h3>ФАЙЛ: {{ file.file }}</h3>
+{% if file.verdict %}
+{% for criterion, value in file.verdict %}
+<h4>{{ criterion }}</h4>
+<p><span class="label">score:</span> {{ value.score }}/10</p>
+<p><span class="label">comment:</span> {{ value.comment }}</p>
+{% for example in value.examples %}<pre>{{ example }}</pre>{% endfor %}
+{% if value.suggestions %}<p><span class="label">suggestions:</span> {{ value.suggestions }}</p>{% endif %}
+{% if value.solution %}<pre>{{ value.solution }}</pre>{% endif %}
+{% endfor %}
+{% else %}
+<p>Не удалось получить результат анализа</p>
+{% endif %}
+{% endfor %}
+{% for heading, issues in [("Vulnerabilities:", pr.static.bandit_issues), ("Poor code style:", pr.static.flake8_issues)] %}
+<h4>{{ heading }}</h4>
+{% if issues %}<ul>{% for issue in issues %}<li>{{ issue.file }}:{{ issue.line }} {{ issue.code }} {{ issue.message }}</li>{% endfor %}</ul>
+{% else %}<p class="label">Not found</p>{% endif %}
+{% endfor %}
+{% if pr.static.not_analyzed %}<h4>Not analysed:</h4>
+<ul>{% for file in pr.static.not_analyzed %}<li>{{ file }}</li>{% endfor %}</ul>{% endif %}
+</section>
+{% endfor %}
+{% if report.review %}
+<h2>Overall Review</h2>
+<p><span class="label">strengths:</span> {{ report.review.strengths }}</p>
+<p><span class="label">improvements:</span> {{ report.review.improvements }}</p>
+<p><span class="label">recommendations:</span> {{ report.review.recommendations }}</p>
+{% endif %}
+{% if report.score is not none %}
+<p><span class="label">ОЦЕНКА LLM-АНАЛИЗА:</span> {{ report.score }}/10</p>
+{% endif %}
+</body>
+</html>
+"""
+
+TEAM_HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>Сводка по команде: {{ summary.repository }}</title>
+<style>
+body { font-family: sans-serif; max-width: 960px; margin: 2em auto; }
+table { border-collapse: collapse; width: 100%; }
+th, td { border: 1px solid #ccc; padding: .3em .5em; text-align: left; }
+.label { font-weight: bold; }
+</style>
+</head>
+<body>
+<h1>Сводка по команде</h1>
+<p>{{ summary.repository }}, {{ summary.start_date.date() }} - {{ summary.end_date.date() }}</p>
+<table>
+<tr><th>Автор</th><th>Email</th><th>PR</th><th>Файлов</th><th>Vulnerabilities</th><th>Poor code style</th><th>Оценка</th><th>Отчет</th></tr>
+{% for author in summary.authors %}
+<tr>
+<td>{{ author.author }}</td><td>{{ author.email }}</td><td>{{ author.prs }}</td><td>{{ author.analyzed_files }}</td>
+<td>{{ author.vulnerabilities }}</td><td>{{ author.style_issues }}</td>
+<td>{% if author.score is not none %}{{ author.score }}/10{% else %}-{% endif %}</td>
+<td>{% if author.report_file %}<a href="{{ author.report_file }}">{{ author.report_file }}</a>{% else %}-{% endif %}</td>
+</tr>
+{% endfor %}
+</table>
+{% if summary.score is not none %}
+<p><span class="label">ОЦЕНКА LLM-АНАЛИЗА КОМАНДЫ:</span> {{ summary.score }}/10</p>
+{% endif %}
+</body>
+</html>
+"""
+
+_html_template = Environment(autoescape=True).from_string(HTML_TEMPLATE)
+_team_html_template = Environment(autoescape=True).from_string(TEAM_HTML_TEMPLATE)
+
+def render_json(report: Report) -> str:
+    """
+    Отчет в формате JSON
+    Args:
+        report: отчет
+    Returns:
+        str: JSON
+    """
+    return report.model_dump_json(indent=2)
+
+def render_html(report: Report) -> str:
+    """
+    Отчет в формате HTML
+    Args:
+        report: отчет
+    Returns:
+        str: HTML-страница
+    """
+    return _html_template.render(report=report)
+
+def render_team_summary(summary: TeamSummary, report_format: str, path_without_suffix: str) -> str:
+    """
+    Запись сводки по команде в файл указанного формата
+    Args:
+        summary: сводка
+        report_format: формат (pdf, json, html, docx)
+        path_without_suffix: путь к файлу без расширения
+    Returns:
+        str: путь к файлу сводки
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат отчета: {report_format}")
+    path = path_without_suffix + REPORT_FORMATS[report_format][0]
+
+    with timed("render"):
+        if report_format == "pdf":
+            write_team_summary_pdf(summary, path)
+        elif report_format == "docx":
+            write_team_summary_docx(summary, path)
+        else:
+            if report_format == "json":
+                text = summary.model_dump_json(indent=2)
+            else:
+                text = _team_html_template.render(summary=summary)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+    return path
+
+def render_report(report: Report, report_format: str, path_without_suffix: str) -> str:
+    """
+    Запись отчета в файл указанного формата
+    Args:
+        report: отчет
+        report_format: формат (pdf, json, html, docx)
+        path_without_suffix: путь к файлу без расширения
+    Returns:
+        str: путь к файлу отчета
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат отчета: {report_format}")
+    path = path_without_suffix + REPORT_FORMATS[report_format][0]
+
+    with timed("render"):
+        if report_format == "pdf":
+            write_report_pdf(report, path)
+        elif report_format == "docx":
+            write_report_docx(report, path)
+        else:
+            text = render_json(report) if report_format == "json" else render_html(report)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+    return path
@@ -0,0 +1,72 @@
+import os
+import subprocess
+
+import pytest
+
+from utils.git_work import get_local_commit_files
+
+
+def git(repo, *args):
+    env = {**os.environ, "GIT_AUTHOR_NAME": "a", "GIT_AUTHOR_EMAIL": "a@x",
+           "GIT_COMMITTER_NAME": "a", "GIT_COMMITTER_EMAIL": "a@x"}
+    return subprocess.run(["git", "-C", str(repo), *args], check=True, env=env,
+                          capture_output=True, text=True).stdout.strip()
+
+
+def commit(repo, message):
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", message)
+    return git(repo, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "main")
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text(f"{name}\n")
+    commit(tmp_path, "init")
+    return tmp_path
+
+
+def patches(repo, sha):
+    return {file["filename"]: file["patch"] for file in get_local_commit_files(str(repo), sha)}
+
+
+def test_type_change_keeps_following_files_aligned(repo):
+    (repo / "a.txt").unlink()
+    os.symlink("c.txt", repo / "a.txt")
+    (repo / "b.txt").write_text("b changed\n")
+    (repo / "c.txt").write_text("c changed\n")
+    files = get_local_commit_files(str(repo), commit(repo, "type change"))
+
+    # смена типа - два патча для одного пути
+    assert [file["filename"] for file in files] == ["a.txt", "a.txt", "b.txt", "c.txt"]
+    assert "+b changed" in files[2]["patch"]
+    assert "+c changed" in files[3]["patch"]
+
+
+def test_paths_with_spaces_and_renames(repo):
+    (repo / "dir with space").mkdir()
+    (repo / "dir with space" / "new file.py").write_text("x = 1\n")
+    git(repo, "mv", "c.txt", "renamed c.txt")
+    (repo / 'quote"d.txt').write_text("q\n")
+    result = patches(repo, commit(repo, "spaces"))
+
+    assert set(result) == {"dir with space/new file.py", "renamed c.txt", 'quote"d.txt'}
+    assert result["dir with space/new file.py"].endswith("+x = 1")
+    assert result["renamed c.txt"] is None
+
+
+def test_merge_commit_is_compared_with_first_parent(repo):
+    git(repo, "checkout", "-q", "-b", "feature")
+    (repo / "feature.py").write_text("y = 2\n")
+    commit(repo, "feature")
+    git(repo, "checkout", "-q", "main")
+    (repo / "a.txt").write_text("main change\n")
+    commit(repo, "main")
+    git(repo, "merge", "-q", "--no-ff", "-m", "merge", "feature")
+
+    result = patches(repo, git(repo, "rev-parse", "HEAD"))
+
+    assert set(result) == {"feature.py"}
+    assert result["feature.py"].endswith("+y = 2")
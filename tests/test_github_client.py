@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from github_client import GithubApiError, GithubClient, RateLimitScheduler
+from utils.cache_work import SqliteCache
+
+
+class StubGithub(BaseHTTPRequestHandler):
+    """
+    Локальный сервер вместо GitHub API: ответы для каждого пути задаются списком
+    (status, body, headers) и выдаются по очереди, последний повторяется
+    """
+    responses = {}
+    hits = []
+    # задержки ответа в секундах для каждого пути (выдаются по очереди)
+    delays = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        StubGithub.hits.append((path, self.headers.get("If-None-Match")))
+        if StubGithub.delays.get(path):
+            time.sleep(StubGithub.delays[path].pop(0))
+        queue = StubGithub.responses.get(path, [(404, {"message": "Not Found"}, {})])
+        status, body, headers = queue.pop(0) if len(queue) > 1 else queue[0]
+
+        headers = {
+            "X-RateLimit-Limit": "5000",
+            "X-RateLimit-Remaining": "4999",
+            "X-RateLimit-Reset": str(int(time.time()) + 3600),
+            **headers,
+        }
+        etag = headers.get("ETag")
+        if status == 200 and etag and self.headers.get("If-None-Match") == etag:
+            status, body = 304, None
+
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def github():
+    StubGithub.responses = {}
+    StubGithub.hits = []
+    StubGithub.delays = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGithub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(base_url, tmp_path=None, timeout=30):
+    etag_cache = SqliteCache(str(tmp_path / "etags.sqlite"), 1024 * 1024) if tmp_path else None
+    return GithubClient(base_url=base_url, scheduler=RateLimitScheduler(min_interval=0), etag_cache=etag_cache,
+                        timeout=timeout)
+
+
+def test_not_modified_returns_cached_response(github, tmp_path):
+    StubGithub.responses["/repos/o/r"] = [(200, {"full_name": "o/r"}, {"ETag": '"v1"'})]
+    client = make_client(github, tmp_path)
+
+    assert client.request("/repos/o/r")[0] == {"full_name": "o/r"}
+    assert client.request("/repos/o/r")[0] == {"full_name": "o/r"}
+
+    assert [etag for _, etag in StubGithub.hits] == [None, '"v1"']
+    assert client.stats == {"requests": 2, "not_modified": 1}
+
+
+def test_server_error_is_retried(github):
+    StubGithub.responses["/repos/o/r"] = [(502, {"message": "Bad Gateway"}, {}), (200, {"full_name": "o/r"}, {})]
+    client = make_client(github)
+
+    assert client.request("/repos/o/r")[0] == {"full_name": "o/r"}
+    assert len(StubGithub.hits) == 2
+
+
+def test_read_timeout_is_retried(github):
+    StubGithub.responses["/repos/o/r"] = [(200, {"full_name": "o/r"}, {})]
+    StubGithub.delays["/repos/o/r"] = [1]
+    client = make_client(github, timeout=0.3)
+
+    assert client.request("/repos/o/r")[0] == {"full_name": "o/r"}
+    assert len(StubGithub.hits) == 2
+
+
+def test_rate_limited_request_waits_and_retries(github):
+    StubGithub.responses["/search/issues"] = [
+        (403, {"message": "API rate limit exceeded"}, {"X-RateLimit-Remaining": "0", "Retry-After": "1"}),
+        (200, {"total_count": 0, "items": []}, {}),
+    ]
+    client = make_client(github)
+
+    started = time.time()
+    assert client.request("/search/issues")[0]["total_count"] == 0
+    assert time.time() - started >= 1
+    assert len(StubGithub.hits) == 2
+
+
+def test_missing_repository_raises_without_retry(github):
+    client = make_client(github)
+
+    with pytest.raises(GithubApiError) as error:
+        client.request("/repos/o/missing")
+    assert error.value.status == 404
+    assert len(StubGithub.hits) == 1
+
+
+def test_search_quota_wait_does_not_block_core_requests():
+    scheduler = RateLimitScheduler(min_interval=0)
+    scheduler.update({
+        "X-RateLimit-Resource": "search",
+        "X-RateLimit-Limit": "30",
+        "X-RateLimit-Remaining": "0",
+        "X-RateLimit-Reset": str(time.time() + 2),
+    })
+    search = threading.Thread(target=scheduler.wait, args=("search",))
+    search.start()
+    time.sleep(0.1)
+
+    started = time.time()
+    scheduler.wait("core")
+    assert time.time() - started < 0.5
+    assert search.is_alive()
+    search.join()
@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# Время последнего обращения обновляется не чаще раза в столько секунд:
+# для LRU-вытеснения такой точности достаточно, а чтение не требует записи в базу
+ACCESS_UPDATE_INTERVAL = 60
+
+class SqliteCache:
+    """
+    Персистентный кэш "ключ - строка" в SQLite с ограничением размера и LRU-вытеснением.
+    Безопасен для использования из нескольких потоков.
+    """
+    def __init__(self, path: str, max_bytes: int, ttl: Optional[float] = None):
+        """
+        Args:
+            path: путь к файлу базы данных
+            max_bytes: максимальный суммарный размер значений в байтах
+            ttl: время жизни записи в секундах (None - без ограничения)
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._conn.commit()
+        # суммарный размер значений: обновляется при записи и удалении, чтобы не считать SUM по всей таблице
+        self._total = self._sum_sizes()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Получение значения из кэша
+        Args:
+            key: ключ
+        Returns:
+            str: значение или None, если записи нет или она устарела
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created_at, accessed_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl is not None and now - row[2] > self.ttl:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total -= row[1]
+                row = None
+            if not row:
+                self.misses += 1
+                return None
+            if now - row[3] > ACCESS_UPDATE_INTERVAL:
+                self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Запись значения в кэш с вытеснением давно не использованных записей
+        Args:
+            key: ключ
+            value: значение
+        """
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._total += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """
+        Статистика использования кэша
+        Returns:
+            dict: количество попаданий, промахов, записей и размер в байтах
+        """
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+    def _evict(self) -> None:
+        """
+        Удаление самых давно использованных записей, пока размер кэша превышает лимит
+        """
+        if self._total <= self.max_bytes:
+            return
+        # файл может использоваться и другими процессами, поэтому перед вытеснением размер пересчитывается
+        self._total = self._sum_sizes()
+        if self._total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM cache ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if self._total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._total -= size
+
+    def _sum_sizes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
@@ -1,29 +1,80 @@
+import logging
+
 from unidiff import PatchSet
-from pathlib import Path
+from typing import Dict, Iterator, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
 
-def parse_diff_to_code_files(diff_path: str, output_dir: str) -> None:
+def restore_code_files(diff_path: str) -> Dict[str, str]:
     """
-    Восстанавливает исходный код из diff файла и сохраняет его в отдельную папку
+    Восстанавливает исходный код файлов из diff файла (добавленные и контекстные строки ханков)
     Args:
         diff_path: путь к файлу diff
-        output_dir: путь к папке, куда будут сохранены исходные файлы
     Returns:
-        None
+        dict: путь файла -> восстановленный код
     """
-    patch = PatchSet.from_filename(diff_path)
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    patch = PatchSet.from_filename(diff_path, encoding='utf-8')
 
+    files = {}
     for patched_file in patch:
-        new_file_path = Path(output_dir) / patched_file.path
-        new_file_path.parent.mkdir(parents=True, exist_ok=True)
+        new_lines = [
+            line.value for hunk in patched_file for line in hunk if line.is_added or line.is_context
+        ]
+        # если файл встречается в диффе несколько раз, остается последняя версия
+        files[patched_file.path] = ''.join(new_lines)
+    return files
+
+def get_added_lines(diff_path: str) -> Dict[str, List[Tuple[int, str]]]:
+    """
+    Добавленные строки всех патчей diff файла (файл может встречаться несколько раз - по разу на коммит)
+    Args:
+        diff_path: путь к файлу diff
+    Returns:
+        dict: путь файла -> список (номер строки после изменения, текст строки) в порядке патчей
+    """
+    patch = PatchSet.from_filename(diff_path, encoding='utf-8')
 
-        new_lines = []
+    files = {}
+    for patched_file in patch:
+        added = files.setdefault(patched_file.path, [])
         for hunk in patched_file:
             for line in hunk:
-                if line.is_added or line.is_context:
-                    new_lines.append(line.value)
+                if line.is_added:
+                    added.append((line.target_line_no, line.value.rstrip()))
+    return files
 
-        with open(new_file_path, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
+def locate_changed_lines(code: str, added: List[Tuple[int, str]]) -> Set[int]:
+    """
+    Номера добавленных строк в итоговой версии файла. Строка ищется на своем месте,
+    а если код выше нее позже менялся - среди строк с тем же текстом (ближайшая по номеру).
+    Пустые строки ищутся только на своем месте; строки, которых нет в итоговом файле, пропускаются
+    Args:
+        code: содержимое файла после мерджа
+        added: добавленные строки из get_added_lines
+    Returns:
+        set: номера строк файла (с 1)
+    """
+    lines = [line.rstrip() for line in code.splitlines()]
+    positions = {}
+    for number, line in enumerate(lines, start=1):
+        positions.setdefault(line, []).append(number)
 
-        print(f"Файл восстановлен: {new_file_path}")
\ No newline at end of file
+    changed = set()
+    for number, text in added:
+        if 0 < number <= len(lines) and lines[number - 1] == text:
+            changed.add(number)
+        elif text.strip() and text in positions:
+            changed.add(min(positions[text], key=lambda candidate: abs(candidate - number)))
+    return changed
+
+def iter_restored_files(diff_path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Восстанавливает исходный код из diff файла в памяти, без записи на диск
+    Args:
+        diff_path: путь к файлу diff
+    Returns:
+        Iterator: пары (путь файла, восстановленный код) в порядке путей
+    """
+    restored_files = restore_code_files(diff_path)
+    for path in sorted(restored_files):
+        yield path, restored_files[path]
@@ -0,0 +1,177 @@
+import base64
+import codecs
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Iterable, Optional, Tuple
+
+import git
+
+MIRRORS_DIR = os.getenv("GIT_MIRRORS_DIR", ".cache/mirrors")
+
+# Блокировки на каждое зеркало, чтобы параллельные отчеты не обновляли его одновременно
+_mirror_locks = {}
+_mirror_locks_guard = threading.Lock()
+
+def _git_env(access_token: Optional[str]) -> Dict[str, str]:
+    """
+    Переменные окружения для git: токен передается заголовком и не сохраняется в конфиге зеркала
+    Args:
+        access_token: токен GitHub
+    Returns:
+        dict: переменные окружения
+    """
+    env = {"GIT_TERMINAL_PROMPT": "0"}
+    if access_token:
+        credentials = base64.b64encode(f"x-access-token:{access_token}".encode()).decode()
+        env.update({
+            "GIT_CONFIG_COUNT": "1",
+            "GIT_CONFIG_KEY_0": "http.extraHeader",
+            "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}",
+        })
+    return env
+
+def sync_mirror(owner: str, repo_name: str, access_token: Optional[str] = None) -> str:
+    """
+    Создание bare-зеркала репозитория или его инкрементальное обновление через fetch.
+    Зеркало содержит все ссылки, включая refs/pull/<номер>/head.
+    Args:
+        owner: владелец репозитория
+        repo_name: название репозитория
+        access_token: токен GitHub
+    Returns:
+        str: путь к зеркалу
+    """
+    mirror_path = str(Path(MIRRORS_DIR) / owner / f"{repo_name}.git")
+    with _mirror_locks_guard:
+        lock = _mirror_locks.setdefault(mirror_path, threading.Lock())
+
+    env = _git_env(access_token)
+    with lock:
+        if Path(mirror_path).exists():
+            with git.Repo(mirror_path) as repo:
+                with repo.git.custom_environment(**env):
+                    repo.git.fetch("--prune", "origin")
+        else:
+            Path(mirror_path).parent.mkdir(parents=True, exist_ok=True)
+            git.Repo.clone_from(f"https://github.com/{owner}/{repo_name}.git", mirror_path, mirror=True, env=env).close()
+    return mirror_path
+
+def list_pr_commits(mirror_path: str, pr_number: int, base_sha: str, emails: Optional[Iterable[str]],
+                    until: datetime) -> List[Tuple[str, str, str]]:
+    """
+    Получение коммитов PR через git log (от старых к новым)
+    Args:
+        mirror_path: путь к зеркалу
+        pr_number: номер PR
+        base_sha: SHA базовой ветки PR
+        emails: email авторов (None - все авторы)
+        until: коммиты не позже этой даты (дата мерджа PR)
+    Returns:
+        list: тройки (SHA коммита, email автора, имя автора)
+    """
+    emails = set(emails) if emails is not None else None
+    args = [
+        f"refs/pull/{pr_number}/head", f"^{base_sha}", "--reverse",
+        f"--until={until.astimezone(timezone.utc).isoformat()}",
+        "--format=%H%x00%ae%x00%an",
+    ]
+    if emails is not None and len(emails) == 1:
+        # для одного автора фильтруем в git, чтобы не разбирать лишние коммиты
+        args[3:3] = ["--fixed-strings", f"--author={next(iter(emails))}"]
+    with git.Repo(mirror_path) as repo:
+        output = repo.git.log(*args)
+
+    # --author ищет подстроку, поэтому email сверяется точно, как и в API
+    commits = []
+    for line in output.splitlines():
+        sha, author_email, author_name = line.split("\x00", 2)
+        if emails is None or author_email in emails:
+            commits.append((sha, author_email, author_name))
+    return commits
+
+def _unquote_path(path: str) -> str:
+    """
+    Путь из заголовка патча: git берет в кавычки пути с кавычками, обратной косой чертой
+    и управляющими символами (даже при core.quotePath=false) и экранирует их как в C
+    Args:
+        path: путь из заголовка
+    Returns:
+        str: путь в репозитории
+    """
+    if len(path) < 2 or not (path.startswith('"') and path.endswith('"')):
+        return path
+    return codecs.escape_decode(path[1:-1].encode("utf-8"))[0].decode("utf-8", errors="replace")
+
+def _patch_filename(lines: List[str]) -> str:
+    """
+    Путь файла из заголовка одного патча (строки от "diff --git" до первого ханка)
+    Args:
+        lines: строки заголовка
+    Returns:
+        str: путь файла после изменения (для удаленного файла - до изменения)
+    """
+    old_path = None
+    for line in lines:
+        if line.startswith(("rename to ", "copy to ")):
+            return _unquote_path(line.split(" to ", 1)[1])
+        # если в пути есть пробел, git добавляет в конце строк ---/+++ табуляцию
+        if line.startswith("+++ ") and line != "+++ /dev/null":
+            return _unquote_path(line[4:].rstrip("\t"))[2:]
+        if line.startswith("--- ") and line != "--- /dev/null":
+            old_path = _unquote_path(line[4:].rstrip("\t"))[2:]
+    if old_path is not None:
+        return old_path
+    # бинарный файл или изменение режима без переименования: "diff --git a/<путь> b/<путь>"
+    header = lines[0][len("diff --git "):]
+    if header.startswith('"'):
+        return _unquote_path(header[header.index('" ') + 2:] if header.endswith('"') else header)[2:]
+    return header[2:2 + (len(header) - 5) // 2]
+
+def get_local_commit_files(mirror_path: str, sha: str) -> List[Dict]:
+    """
+    Получение измененных файлов коммита с патчами в формате GitHub API (только ханки, без заголовков).
+    Как и в API, merge-коммит сравнивается с первым родителем. При смене типа файла
+    (например, файл заменен символической ссылкой) git выводит два патча для одного пути
+    Args:
+        mirror_path: путь к зеркалу
+        sha: SHA коммита
+    Returns:
+        list: список словарей с ключами filename и patch (None для бинарных файлов)
+    """
+    options = ["-r", "--no-color", "--no-commit-id", "--find-renames", "-p"]
+    with git.Repo(mirror_path) as repo:
+        parents = repo.commit(sha).parents
+        revisions = [parents[0].hexsha, sha] if parents else ["--root", sha]
+        output = repo.git(c="core.quotePath=false").diff_tree(*options, *revisions)
+
+    files = []
+    # путь каждого патча берется из его заголовка, а не по порядку в другом выводе git
+    for chunk in re.split(r"^(?=diff --git )", output, flags=re.MULTILINE):
+        if not chunk.startswith("diff --git "):
+            continue
+        lines = chunk.splitlines()
+        patch_start = next((i for i, line in enumerate(lines) if line.startswith("@@")), None)
+        header = lines[:patch_start] if patch_start is not None else lines
+        patch = "\n".join(lines[patch_start:]) if patch_start is not None else None
+        files.append({"filename": _patch_filename(header), "patch": patch})
+    return files
+
+def get_local_file_content(mirror_path: str, sha: str, path: str) -> Optional[str]:
+    """
+    Содержимое файла в указанном коммите (git show <sha>:<путь>)
+    Args:
+        mirror_path: путь к зеркалу
+        sha: SHA коммита
+        path: путь к файлу в репозитории
+    Returns:
+        Optional[str]: содержимое или None, если файла в коммите нет
+    """
+    try:
+        with git.Repo(mirror_path) as repo:
+            content = repo.git.show(f"{sha}:{path}", stdout_as_string=False, strip_newline_in_stdout=False)
+    except git.GitCommandError:
+        return None
+    return content.decode("utf-8", errors="replace")
@@ -0,0 +1,147 @@
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Бюджет токенов истории для итогового обзора разработчика
+HISTORY_TOKEN_BUDGET = 3000
+# Максимальная длина комментария модели в записи истории
+MAX_COMMENT_LENGTH = 200
+
+def estimate_tokens(text: str) -> int:
+    """
+    Приблизительное количество токенов в тексте
+    Args:
+        text: текст
+    Returns:
+        int: оценка количества токенов
+    """
+    return len(text) // 4 + 1
+
+def shorten(text, limit: int = MAX_COMMENT_LENGTH) -> str:
+    """
+    Обрезка текста до указанной длины в одну строку
+    Args:
+        text: текст
+        limit: максимальная длина
+    Returns:
+        str: обрезанный текст
+    """
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+class ReviewHistory:
+    """
+    Компактная история анализа для итогового обзора разработчика.
+    Хранит только структурированные итоги по файлам (оценки, комментарии) и находки
+    статического анализа. Когда история превышает бюджет токенов, старые записи
+    сжимаются в краткое резюме, поэтому промпт итогового обзора ограничен
+    независимо от размера отчета.
+    """
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 summarize: Optional[Callable[[str], str]] = None):
+        """
+        Args:
+            token_budget: бюджет токенов истории
+            summarize: функция сжатия текста (например, запрос к модели);
+                если не задана или завершилась ошибкой, старые записи просто отбрасываются из текста,
+                а в резюме остается их количество
+        """
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.summary = ""
+        self.entries: List[str] = []
+        self._lock = threading.Lock()
+
+    def add_file_verdict(self, pr_number: int, file: str, verdict: Dict) -> None:
+        """
+        Добавление итогов анализа файла моделью
+        Args:
+            pr_number: номер PR
+            file: путь к файлу
+            verdict: результат анализа файла (критерий -> score, comment, ...)
+        """
+        parts = []
+        for criterion, value in verdict.items():
+            if isinstance(value, dict):
+                parts.append(f"{criterion} {value.get('score')}/10 - {shorten(value.get('comment', ''))}")
+        self._add(f"PR #{pr_number} {file}: " + "; ".join(parts))
+
+    def add_static_findings(self, pr_number: int, findings: Dict[str, List[Dict]]) -> None:
+        """
+        Добавление находок статического анализа
+        Args:
+            pr_number: номер PR
+            findings: название инструмента -> список находок (словари с ключами code и message)
+        """
+        parts = []
+        for tool, issues in findings.items():
+            if not issues:
+                parts.append(f"{tool}: no issues")
+                continue
+            codes = {}
+            for issue in issues:
+                key = f"{issue.get('code')} {shorten(issue.get('message', ''), 60)}"
+                codes[key] = codes.get(key, 0) + 1
+            top = sorted(codes.items(), key=lambda item: -item[1])[:5]
+            parts.append(f"{tool}: {len(issues)} issues ({', '.join(f'{key} x{count}' for key, count in top)})")
+        self._add(f"PR #{pr_number} static analysis: " + "; ".join(parts))
+
+    def is_empty(self) -> bool:
+        """
+        Проверка, что в истории нет ни одной записи
+        Returns:
+            bool: True, если обзор строить не по чему
+        """
+        with self._lock:
+            return not self.entries and not self.summary
+
+    def render(self) -> str:
+        """
+        Текст истории для промпта итогового обзора
+        Returns:
+            str: резюме старых записей и последние записи
+        """
+        with self._lock:
+            return self._render()
+
+    def _render(self) -> str:
+        lines = []
+        if self.summary:
+            lines.append(f"Summary of earlier reviews: {self.summary}")
+        lines.extend(self.entries)
+        return "\n".join(lines)
+
+    def _add(self, entry: str) -> None:
+        with self._lock:
+            self.entries.append(entry)
+            if estimate_tokens(self._render()) > self.token_budget:
+                self._compact()
+
+    def _compact(self) -> None:
+        """
+        Сжатие старых записей в резюме (инкрементально: новое резюме строится из предыдущего и старых записей).
+        После сжатия резюме и последние записи занимают не больше половины бюджета,
+        поэтому следующее сжатие понадобится только после заметного роста истории
+        """
+        recent_tokens = 0
+        keep = 0
+        for entry in reversed(self.entries):
+            recent_tokens += estimate_tokens(entry)
+            if recent_tokens > self.token_budget // 4:
+                break
+            keep += 1
+        split = len(self.entries) - keep
+        old, self.entries = self.entries[:split], self.entries[split:]
+        if not old:
+            return
+
+        text = "\n".join(([f"Previous summary: {self.summary}"] if self.summary else []) + old)
+        summary = None
+        if self.summarize:
+            try:
+                summary = self.summarize(text)
+            except Exception:
+                summary = None
+        if not summary:
+            summary = f"{self.summary} {len(old)} more file and static analysis results omitted.".strip()
+        # резюме тоже ограничено (четверть бюджета), чтобы история не росла с каждым сжатием
+        self.summary = shorten(summary, self.token_budget)
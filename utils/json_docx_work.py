@@ -1,5 +1,12 @@
 import json
 import re
+from typing import TYPE_CHECKING
+
+from docx import Document
+
+if TYPE_CHECKING:
+    # report_model импортирует этот модуль, поэтому модели нужны только для аннотаций
+    from report_model import Report, TeamSummary
 
 class LazyDecoder(json.JSONDecoder):
     """
@@ -50,12 +57,100 @@ def write_to_docx_file(file: str, heading:str, text) -> None:
     Args:
         file: файл для записи
         heading: заголовок
-        text: текст
+        text: текст или список находок анализатора (словари с ключами file, line, code, message)
     """
     
     file.add_heading(heading, level=2)
     p = file.add_paragraph('')
     if text == []:
         p.add_run('Not found').bold = True
+    elif isinstance(text, list):
+        for issue in text:
+            file.add_paragraph(f"{issue.get('file')}:{issue.get('line')} {issue.get('code')} {issue.get('message')}")
     else:
         p.add_run(text).bold = True
+
+def write_report_docx(report: "Report", path: str) -> str:
+    """
+    Формирование docx-отчета из данных отчета
+    Args:
+        report: отчет
+        path: путь к docx-файлу
+    Returns:
+        str: путь к docx-файлу
+    """
+    docx = Document()
+    docx.add_heading('Отчет об оценке качества кода', 0)
+    docx.add_paragraph()
+    docx.add_heading(f"Автор: {report.author}", level=1)
+    if report.skipped_repositories:
+        docx.add_heading('Пропущенные репозитории', level=1)
+        for skipped in report.skipped_repositories:
+            p = docx.add_paragraph()
+            p.add_run(f"{skipped.repository}: ").bold = True
+            p.add_run(skipped.error)
+    docx.add_heading('Выявленные проблемы', level=1)
+
+    for pr in report.prs:
+        if pr.repository:
+            p = docx.add_paragraph()
+            p.add_run('\nРЕПОЗИТОРИЙ: ').bold = True
+            p.add_run(pr.repository)
+        p = docx.add_paragraph()
+        p.add_run('\nНОМЕР МР: ').bold = True
+        p.add_run(str(pr.pr_number))
+        p = docx.add_paragraph()
+        p.add_run('КОММИТ: ').bold = True
+        p.add_run(str(pr.commit_sha))
+
+        for file_report in pr.files:
+            p = docx.add_paragraph()
+            p.add_run(f"ФАЙЛ: {file_report.file}\n").bold = True
+            if file_report.verdict is None:
+                docx.add_paragraph("Не удалось получить результат анализа")
+            else:
+                write_json_to_docx_file(docx, file_report.verdict.model_dump())
+
+        write_to_docx_file(docx, 'Vulnerabilities:', [issue.model_dump() for issue in pr.static.bandit_issues])
+        write_to_docx_file(docx, 'Poor code style:', [issue.model_dump() for issue in pr.static.flake8_issues])
+        if pr.static.not_analyzed:
+            write_to_docx_file(docx, 'Not analysed:', ", ".join(pr.static.not_analyzed))
+
+    if report.review:
+        write_json_to_docx_file(docx, report.review_json())
+
+    if report.score is not None:
+        p = docx.add_paragraph()
+        p.add_run('\nОЦЕНКА LLM-АНАЛИЗА: ').bold = True
+        p.add_run(f"{report.score}/10")
+
+    docx.save(path)
+    return path
+
+def write_team_summary_docx(summary: "TeamSummary", path: str) -> str:
+    """
+    Формирование docx-сводки по команде
+    Args:
+        summary: сводка по команде
+        path: путь к docx-файлу
+    Returns:
+        str: путь к docx-файлу
+    """
+    docx = Document()
+    docx.add_heading('Сводка по команде', 0)
+    docx.add_paragraph(f"{summary.repository}, {summary.start_date.date()} - {summary.end_date.date()}")
+
+    for author in summary.authors:
+        docx.add_heading(f"{author.author} ({author.email})", level=1)
+        for label, value in author.summary_lines():
+            p = docx.add_paragraph()
+            p.add_run(label).bold = True
+            p.add_run(value)
+
+    if summary.score is not None:
+        p = docx.add_paragraph()
+        p.add_run('\nОЦЕНКА LLM-АНАЛИЗА КОМАНДЫ: ').bold = True
+        p.add_run(f"{summary.score}/10")
+
+    docx.save(path)
+    return path
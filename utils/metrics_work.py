@@ -0,0 +1,285 @@
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# Этапы формирования отчета, для которых измеряется время:
+# pr_discovery - поиск смердженных PR, commit_fetch - коммиты и патчи одного PR,
+# diff_restore - восстановление кода из диффа, static_analysis - пачка PR в процессе статического анализа,
+# llm_analysis - анализ файлов PR моделью, llm_call - один запрос к модели,
+# render - вывод отчета в файл, cache_check - проверка актуальности кэша отчетов, report - отчет целиком
+# Границы гистограммы длительности этапов в секундах
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+def _escape(value: str, quotes: bool = True) -> str:
+    # экранирование в текстовом формате Prometheus: обратная косая черта, переводы строк
+    # и (в значениях меток) кавычки
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quotes else value
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+class MetricsRegistry:
+    """
+    Метрики процесса в текстовом формате Prometheus: счетчики, значения и гистограммы длительности.
+    Значения различаются по меткам (например, этап или ресурс GitHub)
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # имя -> {'type', 'help', 'values': {метки: значение}}
+        self._metrics: Dict[str, Dict] = {}
+
+    def _values(self, name: str, kind: str, help_text: str, buckets: Optional[Tuple[float, ...]] = None) -> Dict:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = {
+                'type': kind, 'help': help_text, 'values': {}, 'buckets': buckets or self.buckets
+            }
+        return metric['values']
+
+    def inc(self, name: str, value: float = 1, help_text: str = "", **labels) -> None:
+        """
+        Увеличение счетчика
+        Args:
+            name: имя метрики
+            value: прирост
+            help_text: описание метрики
+            **labels: метки
+        """
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            values = self._values(name, "counter", help_text)
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name: str, value: float, help_text: str = "", **labels) -> None:
+        """
+        Установка текущего значения (gauge)
+        Args:
+            name: имя метрики
+            value: значение
+            help_text: описание метрики
+            **labels: метки
+        """
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._values(name, "gauge", help_text)[key] = value
+
+    def observe(self, name: str, value: float, help_text: str = "",
+                buckets: Optional[Tuple[float, ...]] = None, **labels) -> None:
+        """
+        Добавление наблюдения в гистограмму
+        Args:
+            name: имя метрики
+            value: наблюдаемое значение (например, длительность в секундах)
+            help_text: описание метрики
+            buckets: границы гистограммы (по умолчанию границы реестра; задаются при первом наблюдении)
+            **labels: метки
+        """
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            values = self._values(name, "histogram", help_text, buckets)
+            bounds = self._metrics[name]['buckets']
+            histogram = values.get(key)
+            if histogram is None:
+                histogram = values[key] = {'buckets': [0] * len(bounds), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def render(self) -> str:
+        """
+        Метрики в текстовом формате Prometheus
+        Returns:
+            str: текст для ответа /metrics
+        """
+        lines = []
+        with self._lock:
+            for name, metric in sorted(self._metrics.items()):
+                if metric['help']:
+                    lines.append(f"# HELP {name} {_escape(metric['help'], quotes=False)}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for key, value in sorted(metric['values'].items()):
+                    if metric['type'] != "histogram":
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+                        continue
+                    for bound, count in zip(metric['buckets'], value['buckets']):
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', str(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {value['sum']}")
+                    lines.append(f"{name}_count{_format_labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+class RunTiming:
+    """
+    Время этапов и запросы к модели одного отчета
+    """
+    def __init__(self):
+        self.started = time.time()
+        # время завершения отчета (None, пока отчет формируется)
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict] = {}
+        self.counts: Dict[str, int] = {}
+        self.llm = {'calls': 0, 'seconds': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(stage, {'seconds': 0.0, 'count': 0})
+            entry['seconds'] += seconds
+            entry['count'] += 1
+
+    def count(self, name: str, value: int) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def add_llm(self, seconds: float, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.llm['calls'] += 1
+            self.llm['seconds'] += seconds
+            self.llm['prompt_tokens'] += prompt_tokens
+            self.llm['completion_tokens'] += completion_tokens
+
+    def as_dict(self) -> Dict:
+        """
+        Разбивка времени отчета в формате JSON. Время этапов, которые выполняются параллельно
+        (запросы к модели, коммиты PR), суммируется, поэтому может превышать общее время
+        Returns:
+            Dict: total_seconds (до завершения отчета - до текущего момента), stages (этап -> seconds, count),
+                counts, llm
+        """
+        with self._lock:
+            return {
+                'total_seconds': round((self.finished or time.time()) - self.started, 3),
+                'stages': {
+                    stage: {'seconds': round(entry['seconds'], 3), 'count': entry['count']}
+                    for stage, entry in self.stages.items()
+                },
+                'counts': dict(self.counts),
+                'llm': {**self.llm, 'seconds': round(self.llm['seconds'], 3)},
+            }
+
+# Метрики процесса для /metrics
+METRICS = MetricsRegistry()
+# Время этапов текущего отчета (None вне отчета)
+_current_run: contextvars.ContextVar[Optional[RunTiming]] = contextvars.ContextVar("current_run", default=None)
+
+@contextmanager
+def track_run(timing: Optional[RunTiming] = None):
+    """
+    Сбор времени этапов отчета: все этапы, выполненные внутри блока with
+    (и в функциях, переданных в пулы через propagate), попадают в возвращаемый RunTiming.
+    Если передан timing, этапы дописываются в него (продолжение отчета в другом потоке).
+    При выходе из блока отмечается время завершения отчета
+    """
+    timing = timing or RunTiming()
+    timing.finished = None
+    token = _current_run.set(timing)
+    try:
+        yield timing
+    finally:
+        timing.finished = time.time()
+        _current_run.reset(token)
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Привязка функции к текущему отчету для выполнения в пуле потоков
+    Args:
+        fn: функция
+    Returns:
+        Callable: функция, которая в любом потоке записывает время этапов в текущий отчет
+    """
+    timing = _current_run.get()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = _current_run.set(timing)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_run.reset(token)
+    return run
+
+def record(stage: str, seconds: float, timing: Optional[RunTiming] = None) -> None:
+    """
+    Запись длительности этапа в метрики процесса и в текущий отчет
+    Args:
+        stage: этап
+        seconds: длительность
+        timing: отчет (по умолчанию текущий)
+    """
+    METRICS.observe("code_review_stage_duration_seconds", seconds,
+                    "Длительность этапов формирования отчета, с", stage=stage)
+    timing = timing or _current_run.get()
+    if timing is not None:
+        timing.add(stage, seconds)
+
+@contextmanager
+def timed(stage: str):
+    """
+    Измерение длительности блока with как этапа stage
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+def count(name: str, value: int = 1) -> None:
+    """
+    Счетчик текущего отчета (например, количество запросов к GitHub)
+    Args:
+        name: имя счетчика
+        value: прирост
+    """
+    timing = _current_run.get()
+    if timing is not None:
+        timing.count(name, value)
+
+def record_llm_call(seconds: float, prompt_tokens: int, completion_tokens: int) -> None:
+    """
+    Запись запроса к модели: длительность и токены промпта и ответа
+    Args:
+        seconds: длительность запроса
+        prompt_tokens: токенов в промпте
+        completion_tokens: токенов в ответе
+    """
+    record("llm_call", seconds)
+    METRICS.inc("code_review_llm_tokens_total", prompt_tokens, "Токены запросов к модели", direction="in")
+    METRICS.inc("code_review_llm_tokens_total", completion_tokens, "Токены запросов к модели", direction="out")
+    timing = _current_run.get()
+    if timing is not None:
+        timing.add_llm(seconds, prompt_tokens, completion_tokens)
+
+def run_timed(fn: Callable, *args) -> Tuple[object, float]:
+    """
+    Выполнение функции с измерением времени (для пула процессов, где метрики родителя недоступны)
+    Returns:
+        Tuple[object, float]: результат и длительность в секундах
+    """
+    started = time.perf_counter()
+    return fn(*args), time.perf_counter() - started
+
+def record_future(stage: str) -> Callable[[Future], None]:
+    """
+    Обработчик завершения Future с результатом run_timed: длительность записывается
+    как этап stage текущего отчета (обработчик вызывается в другом потоке)
+    Args:
+        stage: этап
+    Returns:
+        Callable[[Future], None]: функция для add_done_callback
+    """
+    timing = _current_run.get()
+
+    def done(future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            record(stage, future.result()[1], timing)
+    return done
@@ -0,0 +1,183 @@
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict
+
+from fpdf import FPDF
+
+if TYPE_CHECKING:
+    # report_model импортирует этот модуль, поэтому модели нужны только для аннотаций
+    from report_model import Report, TeamSummary
+
+# TTF-шрифт с кириллицей для pdf-отчета (путь к файлу обычного начертания)
+REPORT_PDF_FONT = os.getenv("REPORT_PDF_FONT")
+# Шрифты, которые ищутся, если REPORT_PDF_FONT не задан: (обычный, жирный)
+DEFAULT_FONTS = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("/Library/Fonts/Arial Unicode.ttf", None),
+    ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
+]
+FONT_NAME = "ReportFont"
+LINE_HEIGHT = 6
+
+def find_font() -> tuple:
+    """
+    Поиск TTF-шрифта для отчета
+    Returns:
+        tuple: пути к обычному и жирному (или None) начертаниям
+    """
+    if REPORT_PDF_FONT:
+        regular = Path(REPORT_PDF_FONT)
+        bold = regular.with_name(f"{regular.stem}-Bold{regular.suffix}")
+        return str(regular), str(bold) if bold.exists() else None
+    for regular, bold in DEFAULT_FONTS:
+        if Path(regular).exists():
+            return regular, bold if bold and Path(bold).exists() else None
+    raise FileNotFoundError(
+        "Не найден TTF-шрифт с кириллицей для pdf-отчета, укажите путь к нему в переменной окружения REPORT_PDF_FONT"
+    )
+
+class ReportPdf(FPDF):
+    """
+    Pdf-документ отчета с тем же оформлением, что и docx-отчет: заголовки, подписи жирным и текст
+    """
+    def __init__(self):
+        super().__init__()
+        regular, bold = find_font()
+        self.add_font(FONT_NAME, "", regular)
+        # без жирного начертания подписи выводятся обычным шрифтом
+        self.add_font(FONT_NAME, "B", bold or regular)
+        self.set_auto_page_break(auto=True, margin=15)
+        self.add_page()
+        self.set_font(FONT_NAME, size=11)
+
+    def heading(self, text: str, level: int = 1) -> None:
+        """
+        Заголовок
+        Args:
+            text: текст заголовка
+            level: уровень (0 - заголовок документа)
+        """
+        size = {0: 20, 1: 15, 2: 13}.get(level, 11)
+        self.ln(2)
+        self.set_font(FONT_NAME, "B", size)
+        self.multi_cell(0, size * 0.5, text, new_x="LMARGIN", new_y="NEXT")
+        self.set_font(FONT_NAME, "", 11)
+        self.ln(1)
+
+    def labeled(self, label: str, text: str = "") -> None:
+        """
+        Строка "подпись: текст" с подписью жирным
+        Args:
+            label: подпись
+            text: текст
+        """
+        self.set_font(FONT_NAME, "B", 11)
+        self.write(LINE_HEIGHT, label)
+        self.set_font(FONT_NAME, "", 11)
+        self.write(LINE_HEIGHT, text)
+        self.ln(LINE_HEIGHT)
+
+    def paragraph(self, text: str) -> None:
+        """
+        Абзац текста
+        Args:
+            text: текст
+        """
+        self.multi_cell(0, LINE_HEIGHT, text, new_x="LMARGIN", new_y="NEXT")
+
+    def json_block(self, data: Dict) -> None:
+        """
+        Вывод JSON вида {раздел: {ключ: значение}} (как write_json_to_docx_file)
+        Args:
+            data: JSON
+        """
+        for key, small_json in data.items():
+            self.heading(key, level=2)
+            for k, value in small_json.items():
+                self.labeled(f"{k}: ", str(value).replace("\n", "   "))
+
+    def issues(self, heading: str, issues: list) -> None:
+        """
+        Вывод находок анализатора (как write_to_docx_file)
+        Args:
+            heading: заголовок
+            issues: список находок (report_model.StaticIssue)
+        """
+        self.heading(heading, level=2)
+        if not issues:
+            self.labeled("Not found")
+            return
+        for issue in issues:
+            self.paragraph(f"{issue.file}:{issue.line} {issue.code} {issue.message}")
+
+def write_report_pdf(report: "Report", path: str) -> str:
+    """
+    Формирование pdf-отчета из данных отчета без промежуточного docx
+    Args:
+        report: отчет
+        path: путь к pdf-файлу
+    Returns:
+        str: путь к pdf-файлу
+    """
+    pdf = ReportPdf()
+    pdf.heading('Отчет об оценке качества кода', level=0)
+    pdf.heading(f"Автор: {report.author}", level=1)
+    if report.skipped_repositories:
+        pdf.heading('Пропущенные репозитории', level=1)
+        for skipped in report.skipped_repositories:
+            pdf.labeled(f"{skipped.repository}: ", skipped.error)
+    pdf.heading('Выявленные проблемы', level=1)
+
+    for pr in report.prs:
+        pdf.ln(LINE_HEIGHT)
+        if pr.repository:
+            pdf.labeled('РЕПОЗИТОРИЙ: ', pr.repository)
+        pdf.labeled('НОМЕР МР: ', str(pr.pr_number))
+        pdf.labeled('КОММИТ: ', str(pr.commit_sha))
+        for file_report in pr.files:
+            pdf.labeled(f"ФАЙЛ: {file_report.file}")
+            if file_report.verdict is None:
+                pdf.paragraph("Не удалось получить результат анализа")
+            else:
+                pdf.json_block(file_report.verdict.model_dump())
+        pdf.issues('Vulnerabilities:', pr.static.bandit_issues)
+        pdf.issues('Poor code style:', pr.static.flake8_issues)
+        if pr.static.not_analyzed:
+            pdf.heading('Not analysed:', level=2)
+            pdf.paragraph(", ".join(pr.static.not_analyzed))
+
+    if report.review:
+        pdf.json_block(report.review_json())
+
+    if report.score is not None:
+        pdf.ln(LINE_HEIGHT)
+        pdf.labeled('ОЦЕНКА LLM-АНАЛИЗА: ', f"{report.score}/10")
+
+    pdf.output(path)
+    return path
+
+def write_team_summary_pdf(summary: "TeamSummary", path: str) -> str:
+    """
+    Формирование pdf-сводки по команде
+    Args:
+        summary: сводка по команде
+        path: путь к pdf-файлу
+    Returns:
+        str: путь к pdf-файлу
+    """
+    pdf = ReportPdf()
+    pdf.heading('Сводка по команде', level=0)
+    pdf.paragraph(f"{summary.repository}, {summary.start_date.date()} - {summary.end_date.date()}")
+
+    for author in summary.authors:
+        pdf.heading(f"{author.author} ({author.email})", level=1)
+        for label, value in author.summary_lines():
+            pdf.labeled(label, value)
+
+    if summary.score is not None:
+        pdf.ln(LINE_HEIGHT)
+        pdf.labeled('ОЦЕНКА LLM-АНАЛИЗА КОМАНДЫ: ', f"{summary.score}/10")
+
+    pdf.output(path)
+    return path
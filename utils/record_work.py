@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from utils.cache_work import SqliteCache
+
+# Результаты анализа PR из предыдущих отчетов: вердикты модели, находки статического анализа, оценка
+PR_RECORDS_PATH = os.getenv("PR_RECORDS_PATH", ".cache/pr_records.sqlite")
+PR_RECORDS_MAX_BYTES = int(os.getenv("PR_RECORDS_MAX_MB", "512")) * 1024 * 1024
+
+_pr_records = None
+_pr_records_lock = threading.Lock()
+
+def get_pr_records() -> SqliteCache:
+    """
+    Возвращает общее для процесса хранилище результатов анализа PR, создавая его при первом обращении
+    Returns:
+        SqliteCache: хранилище результатов анализа PR
+    """
+    global _pr_records
+    with _pr_records_lock:
+        if _pr_records is None:
+            _pr_records = SqliteCache(PR_RECORDS_PATH, PR_RECORDS_MAX_BYTES)
+        return _pr_records
+
+def pr_record_key(repository: str, diff: Dict, version: str) -> str:
+    """
+    Ключ результата анализа PR: репозиторий, номер PR, коммиты автора и версия анализа.
+    Если автор добавил или переписал коммиты, ключ меняется и PR анализируется заново
+    Args:
+        repository: полное имя репозитория (owner/name)
+        diff: информация о PR (элемент результата get_diffs)
+        version: модель и версия промпта
+    Returns:
+        str: ключ
+    """
+    commits = hashlib.sha256("\n".join(diff['author_commit_shas']).encode()).hexdigest()
+    return f"{repository}#{diff['pr_number']}:{commits}:{version}"
+
+def load_pr_record(records: SqliteCache, key: str) -> Optional[Dict]:
+    """
+    Получение сохраненного результата анализа PR
+    Args:
+        records: хранилище результатов
+        key: ключ (pr_record_key)
+    Returns:
+        dict: результат анализа или None, если PR еще не анализировался
+    """
+    value = records.get(key)
+    return json.loads(value) if value else None
+
+def save_pr_record(records: SqliteCache, key: str, record: Dict) -> None:
+    """
+    Сохранение результата анализа PR
+    Args:
+        records: хранилище результатов
+        key: ключ (pr_record_key)
+        record: результат анализа
+    """
+    records.set(key, json.dumps(record, ensure_ascii=False))